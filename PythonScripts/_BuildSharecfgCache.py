@@ -0,0 +1,15 @@
+from lib import ALJsonAPI, Client
+from lib.sharecfgcache import CacheWrapper_JsonLoader
+
+
+def main():
+	api = ALJsonAPI()
+	if not isinstance(api.loader, CacheWrapper_JsonLoader):
+		print("No sharecfg cache is enabled, set 'sharecfg_cache' in the settings file first.")
+		return
+
+	built = api.loader.build_cache(Client)
+	print(f"Built {built} sharecfg cache files.")
+
+if __name__ == "__main__":
+	main()
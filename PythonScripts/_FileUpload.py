@@ -1,94 +1,179 @@
-import sys
+import json
+import hashlib
+import threading
 from pathlib import Path
 from enum import Enum, auto
+from itertools import batched
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from mwclient import APIError
 
 from lib import WikiHelper
 
 
+JOURNAL_PATH = Path("data", "cache", "upload_journal.jsonl")
+# warnings that are ignored by default by uploading the file anyway, uploads with other warnings are skipped
+DEFAULT_IGNORED_WARNINGS = {'exists', 'exists-normalized', 'page-exists'}
+
+
 class UploadResult(Enum):
 	SUCCESS = auto()
 	FAILURE = auto()
 	FAILURE_SAME = auto()
-	WARNING_EXIST = auto()
-	WARNING_DELETED = auto()
-	WARNING_SIMILAR_NAME = auto()
-
-
-def do_upload(wikiclient: WikiHelper.WikiClient, *args, **kwargs) -> UploadResult:
-	try:
-		result = wikiclient.execute(wikiclient.mwclient.upload, *args, **kwargs)
-	except APIError as error:
-		# handle additional duplicate error otherwise raise the exception again
-		if error.code == 'fileexists-no-change':
-			print('Is duplicate, skipping.')
-			return UploadResult.FAILURE_SAME
-		raise error
-
-	# handle other return type
-	if 'upload' in result:
-		result = result['upload']
-
-	if result:
+	SKIPPED = auto()
+
+# results after which the same file does not have to be uploaded again
+DONE_RESULTS = {UploadResult.SUCCESS.name, UploadResult.FAILURE_SAME.name}
+
+
+class UploadJournal():
+	"""
+	Append-only record of finished uploads, so an interrupted run can be resumed
+	without uploading the same files again.
+	"""
+	def __init__(self, path: Path):
+		self.path = path
+		self.entries = {}
+		self._lock = threading.Lock()
+		if path.exists():
+			with open(path, 'r', encoding='utf8') as f:
+				for line in f:
+					if line.strip():
+						entry = json.loads(line)
+						self.entries[entry['path']] = entry
+
+	def is_done(self, filepath: Path, sha1: str) -> bool:
+		"""Returns whether the file with the same content has been uploaded or already was on the wiki.
+		Skipped files are not done, so they are retried e.g. with different ignored warnings."""
+		entry = self.entries.get(str(filepath))
+		return entry is not None and entry['sha1'] == sha1 and entry['result'] in DONE_RESULTS
+
+	def record(self, filepath: Path, sha1: str, result: UploadResult) -> None:
+		entry = {'path': str(filepath), 'sha1': sha1, 'result': result.name}
+		with self._lock:
+			self.entries[entry['path']] = entry
+			self.path.parent.mkdir(parents=True, exist_ok=True)
+			with open(self.path, 'a', encoding='utf8') as f:
+				f.write(json.dumps(entry)+'\n')
+
+
+def hash_file(filepath: Path) -> str:
+	"""Returns the SHA-1 hash of a file, which is also used by mediawiki to identify file contents."""
+	with open(filepath, 'rb') as f:
+		return hashlib.file_digest(f, 'sha1').hexdigest()
+
+def query_file_hashes(wikiclient: WikiHelper.WikiClient, filenames: list[str], batch_size: int = 50) -> dict[str, str | None]:
+	"""Returns the SHA-1 hashes of the current versions of the wiki files with *filenames*,
+	None for files that do not exist yet."""
+	hashes = {}
+	for batch in batched(filenames, batch_size):
+		result = wikiclient.execute(wikiclient.mwclient.api, 'query', prop='imageinfo', iiprop='sha1',
+			titles='|'.join('File:'+filename for filename in batch), formatversion=2)['query']
+		normalized = {entry['to']: entry['from'] for entry in result.get('normalized', [])}
+		for pagedata in result.get('pages', []):
+			title = normalized.get(pagedata['title'], pagedata['title'])
+			imageinfo = pagedata.get('imageinfo')
+			hashes[title.removeprefix('File:')] = imageinfo[0]['sha1'] if imageinfo else None
+	return hashes
+
+
+def do_upload(wikiclient: WikiHelper.WikiClient, filepath: Path, ignored_warnings: set[str]) -> UploadResult:
+	ignore = False
+	while True:
+		try:
+			with open(filepath, 'rb') as file:
+				result = wikiclient.execute(wikiclient.mwclient.upload, file, filename=filepath.name, ignore=ignore)
+		except APIError as error:
+			# handle additional duplicate error otherwise raise the exception again
+			if error.code == 'fileexists-no-change':
+				return UploadResult.FAILURE_SAME
+			raise error
+
+		# handle other return type
+		if 'upload' in result:
+			result = result['upload']
+
+		if not result:
+			print(f'{filepath.name}: Failed to upload.')
+			return UploadResult.FAILURE
 		if result['result'] == 'Success':
-			print('Done.')
 			return UploadResult.SUCCESS
+		if result['result'] != 'Warning':
+			print(f'{filepath.name}: Failed with Unknown Error: {result}')
+			return UploadResult.FAILURE
 
-		if result['result'] == 'Warning':
-			if 'exists' in result['warnings']:
-				if not (('no-change' in result['warnings']) or ('duplicate-version' in result['warnings'])):
-					return UploadResult.WARNING_EXIST
-				print("Warning (exists):")
-				print(result)
-			elif 'was-deleted' in result['warnings']:
-				print("Waning: File was previously deleted.")
-				i = input("Retry uploading? (y/n): ")
-				if i.lower() == 'y':
-					return UploadResult.WARNING_DELETED
-			elif 'page-exists' in result['warnings']:
-				print("Waning: File page already exists, but has no file.")
-				i = input("Retry uploading? (y/n): ")
-				if i.lower() == 'y':
-					return UploadResult.WARNING_EXIST
-			elif 'exists-normalized' in result['warnings']:
-				return UploadResult.WARNING_SIMILAR_NAME
+		warnings = result['warnings']
+		if 'no-change' in warnings or 'duplicate-version' in warnings:
+			return UploadResult.FAILURE_SAME
+		if ignore or not set(warnings) <= ignored_warnings:
+			print(f'{filepath.name}: Skipped because of warnings: {", ".join(warnings)}')
+			return UploadResult.SKIPPED
+		ignore = True
+
+def upload_files(wikiclient: WikiHelper.WikiClient, filepaths: list[Path], journal: UploadJournal,
+		ignored_warnings: set[str] = DEFAULT_IGNORED_WARNINGS, workers: int = 4) -> dict[UploadResult, int]:
+	"""Uploads all files that are not yet on the wiki with the same content and not finished according to the *journal*.
+	Returns the amount of files for each result."""
+	counts = {result: 0 for result in UploadResult}
+	counts_lock = threading.Lock()
+	def finish(filepath: Path, sha1: str, result: UploadResult) -> None:
+		journal.record(filepath, sha1, result)
+		with counts_lock:
+			counts[result] += 1
+
+	with ThreadPoolExecutor(workers) as executor:
+		hashes = dict(zip(filepaths, executor.map(hash_file, filepaths)))
+		pending = [filepath for filepath in filepaths if not journal.is_done(filepath, hashes[filepath])]
+		print(f'{len(filepaths)-len(pending)} files already uploaded according to the journal.')
+
+		# files with identical content on the wiki don't have to be uploaded at all
+		wiki_hashes = query_file_hashes(wikiclient, [filepath.name for filepath in pending])
+		uploads = []
+		for filepath in pending:
+			if wiki_hashes.get(filepath.name) == hashes[filepath]:
+				finish(filepath, hashes[filepath], UploadResult.FAILURE_SAME)
 			else:
-				print("Warning:")
-				print(result)
+				uploads.append(filepath)
+		print(f'{len(pending)-len(uploads)} files are unchanged on the wiki, uploading {len(uploads)} files...')
 
-		else:
-			print('Failed with Unknown Error:')
-			print(result)
+		def upload(filepath: Path) -> None:
+			try:
+				result = do_upload(wikiclient, filepath, ignored_warnings)
+			except Exception as error:
+				print(f'{filepath.name}: {type(error).__name__}: {error}')
+				result = UploadResult.FAILURE
+			finish(filepath, hashes[filepath], result)
+			if result == UploadResult.SUCCESS:
+				print(f'Uploaded {filepath.name}.')
 
-	else:
-		print('Failed to upload.')
-	return UploadResult.FAILURE
-
-def upload_file(wikiclient: WikiHelper.WikiClient, filepath: Path):
-	print(f'Uploading {filepath.name}... ', end='')
-	result = do_upload(wikiclient, open(filepath, 'rb'), filename=filepath.name)
-	while True:
-		if result in (UploadResult.SUCCESS, UploadResult.FAILURE, UploadResult.FAILURE_SAME):
-			break
-		if result in (UploadResult.WARNING_EXIST, UploadResult.WARNING_DELETED, UploadResult.WARNING_SIMILAR_NAME):
-			result = do_upload(wikiclient, open(filepath, 'rb'), filename=filepath.name, ignore=True)
+		for _ in executor.map(upload, uploads):
+			pass
+	return counts
 
 
 def main():
-	wikiclient = WikiHelper.WikiClient().login()
-	args = sys.argv[1:]
-
-	for arg in args:
-		argpath = Path(arg)
+	parser = ArgumentParser(description="Uploads files to the wiki, skipping files that are already uploaded.")
+	parser.add_argument("paths", type=Path, nargs='+', help="files or directories to upload")
+	parser.add_argument("-w", "--workers", type=int, default=4, help="amount of concurrent uploads")
+	parser.add_argument("-j", "--journal", type=Path, default=JOURNAL_PATH,
+		help="file recording finished uploads, used to resume interrupted runs")
+	parser.add_argument("-i", "--ignore-warnings", nargs='*', default=sorted(DEFAULT_IGNORED_WARNINGS),
+		help="upload warnings for which the file is uploaded anyway, files with other warnings are skipped")
+	args = parser.parse_args()
+
+	filepaths = []
+	for argpath in args.paths:
 		if not argpath.exists():
-			print(f"Input File {arg} does not exist.")
-			continue
-
-		if argpath.is_dir():
-			for fp in argpath.rglob("*"):
-				upload_file(wikiclient, fp)
+			print(f"Input File {argpath} does not exist.")
+		elif argpath.is_dir():
+			filepaths.extend(fp for fp in argpath.rglob("*") if fp.is_file())
 		else:
-			upload_file(wikiclient, argpath)
+			filepaths.append(argpath)
+
+	wikiclient = WikiHelper.WikiClient().login()
+	counts = upload_files(wikiclient, filepaths, UploadJournal(args.journal), set(args.ignore_warnings), args.workers)
+	print(", ".join(f"{count} {result.name.lower()}" for result, count in counts.items()))
+	print(f"Finished: {wikiclient.metrics}")
 
 if __name__ == "__main__":
 	main()
@@ -0,0 +1,62 @@
+import time
+from pathlib import Path
+from argparse import ArgumentParser
+
+from lib import WikiHelper
+
+
+def sample_pages(skins: int = 12, lines: int = 40) -> dict[str, str]:
+	"""Returns synthetic gallery and quote pages, with templates nested the same way as on the wiki."""
+	skin_templates = '|-|\n'.join(
+		f'Skin{i}=\n{{{{ShipSkin\n | SkinID = {i}\n | Name = Skin {i} {{{{Tooltip|a|b=c}}}}\n'
+		f' | Shop = [[File:Gem.png|20px]] {{{{Gem|{i*100}}}}} <!-- | -->\n}}}}\n' for i in range(skins))
+	gallery = '{{ShipTabber}}\n{{#tag:tabber|\n'+skin_templates+'}}\n\n== Additional Art ==\n[[File:Art.png]]'
+
+	quote_templates = ''.join(
+		f'{{{{ShipQuote\n | Region = EN\n | Skin = Skin{i}\n'+''.join(
+			f' | Line{j} = Hello [[Link|x]] {{{{Tooltip|a|b=c}}}} <!-- c|d -->\n' for j in range(lines))+'}}\n'
+		for i in range(skins))
+	quotes = '<tabber>\nEN=\n'+quote_templates+'|-|\nJP=\n'+quote_templates+'</tabber>'
+	return {'synthetic gallery': gallery, 'synthetic quotes': quotes}
+
+
+def benchmark(pages: dict[str, str], repeat: int) -> None:
+	"""Compares the bracket scanner with mwparserfromhell on the wikitext of *pages* and checks that both give the same templates."""
+	for name, parse in (('scanner', WikiHelper.extract_templates), ('mwparserfromhell', WikiHelper._parse_templates_fallback)):
+		start = time.perf_counter()
+		for _ in range(repeat):
+			for wikitext in pages.values():
+				parse(wikitext, None, True)
+		duration = (time.perf_counter() - start) / repeat
+		print(f"{name:<17} {duration*1000:8.2f}ms per run")
+
+	for title, wikitext in pages.items():
+		try:
+			scanned = WikiHelper.extract_templates(wikitext)
+		except WikiHelper.TemplateSyntaxError as error:
+			print(f"{title}: falls back to mwparserfromhell ({error})")
+			continue
+		if scanned != WikiHelper._parse_templates_fallback(wikitext, None, True):
+			print(f"{title}: templates differ from mwparserfromhell")
+
+
+def main():
+	parser = ArgumentParser(description="Benchmarks the template extraction against mwparserfromhell.")
+	parser.add_argument("titles", nargs='*', help="wiki pages to benchmark, loaded through the wiki page cache")
+	parser.add_argument("-f", "--files", type=Path, nargs='+', default=[], help="files containing wikitext to benchmark")
+	parser.add_argument("-r", "--repeat", type=int, default=10, help="amount of runs over all pages")
+	parser.add_argument("--offline", action="store_true", help="only use pages that are already cached")
+	args = parser.parse_args()
+
+	pages = sample_pages()
+	pages |= {str(filepath): filepath.read_text(encoding='utf8') for filepath in args.files}
+	if args.titles:
+		wikiclient = None if args.offline else WikiHelper.WikiClient().login()
+		page_cache = WikiHelper.WikiPageCache(wikiclient)
+		pages |= {title: page.wikitext for title, page in page_cache.get_pages(args.titles).items() if page.exists}
+
+	print(f"Parsing {len(pages)} pages ({sum(len(wikitext) for wikitext in pages.values())/1024:.0f} KiB).")
+	benchmark(pages, args.repeat)
+
+if __name__ == "__main__":
+	main()
@@ -1,10 +1,13 @@
 import re
+import os
+from pathlib import Path
 from argparse import ArgumentParser
 from difflib import get_close_matches
 from collections.abc import Iterable
 
 from lib import ALJsonAPI, Client, WikiHelper, Utility
 from lib.Constants import Nation, ShipType
+from lib.converter.equips import EquipConvertResult
 
 from ship import get_skilldesc
 
@@ -304,8 +307,7 @@ def convert_reload(x):
 def skill_desc_enhance(api,desc):
 	for i in Nation:
 		if i not in (Nation.KIZUNA_AI,): desc = desc.replace(str(i),f"[[{i}]]",1)
-	for i in api.ship_converter.ship_to_id.keys():
-		if i not in ('Eagle','Vanguard'): desc = re.sub(r'\b'+i+r'\b','[['+i+']]',desc,1)
+	desc = api.ship_converter.link_shipnames(desc, exclude=('Eagle','Vanguard'))
 	desc = re.sub('armor break', 'Armor Break',desc,flags=re.I).replace('burn','Burn').replace('flood','Flood')
 	desc = re.sub('Armor Break','[[Combat#Armor_breaking/shattering|Armour Break]]',desc,1)
 	desc = re.sub('Burn','[[Combat#Fire_Damage|Burn]]',desc,1)
@@ -640,11 +642,10 @@ def getGameData(equip, api: ALJsonAPI, clients: Iterable[Client]):
 
 
 	#GEAR LAB
-	upgrades = equip_upgrade_data.load_all(clients)
 	LabFrom = []
 	LabTo = []
-	for i in upgrades:
-		if i.target_id == equip_id:
+	for upgradeid in equip_upgrade_data.index_by("target_id", clients).get(equip_id, []):
+		if i := equip_upgrade_data.load_first(upgradeid, clients):
 			source_id = i.upgrade_from
 			source_stats = equip_data_statistics.load_first(source_id, clients)
 			rarity = source_stats.get('rarity')
@@ -652,7 +653,8 @@ def getGameData(equip, api: ALJsonAPI, clients: Iterable[Client]):
 			conv = api.equip_converter.from_equipid(source_id)
 			text = '{{'+f"EquipmentBox|{rarity}|{conv.wikiname}|{conv.wikiname}{(f'#{tech}-0' if tech != 'Type 0' else '')}|{conv.icon}}}}} [[{conv.wikiname}{(f'#{tech}-0|{conv.wikiname}' if tech != 'Type 0' else '')}]]"
 			LabFrom.append(text)
-		if i.upgrade_from == equip_id:
+	for upgradeid in equip_upgrade_data.index_by("upgrade_from", clients).get(equip_id, []):
+		if i := equip_upgrade_data.load_first(upgradeid, clients):
 			target_id = i.target_id
 			target_stats = equip_data_statistics.load_first(target_id, clients)
 			rarity = target_stats.get('rarity')
@@ -688,16 +690,102 @@ def getGameData(equip, api: ALJsonAPI, clients: Iterable[Client]):
 	equip_data['Notes'] = '\n'.join(notes)
 	return equip_data
 
+def equip_wikitext(equips: list[EquipConvertResult | int], api: ALJsonAPI, clients: Iterable[Client]) -> str:
+	"""Returns the wikitext of a single equipment page, using tabs if there are multiple *equips*."""
+	if len(equips) > 1:
+		wikitext = "<tabber>"
+	else:
+		wikitext = ''
+	for n,equip in enumerate(equips):
+		template_data_game = getGameData(equip, api, clients)
+		if not template_data_game:
+			print('No game data returned for this equip', equip)
+			continue
+		if wikitext:
+			wikitext += f"Type {template_data_game['Tech'][-1]}=\n"
+		equip_template = WikiHelper.MultilineTemplate("Equipment")
+		wikitext += equip_template.fill(template_data_game)
+		if n+1<len(equips):
+			wikitext += "\n|-|"
+	if len(equips) > 1:
+		wikitext += '\n</tabber>'
+	return wikitext
+
+def equip_pages(api: ALJsonAPI, clients: Iterable[Client], types: Iterable[int] | None = None) -> list[list[EquipConvertResult | int]]:
+	"""Returns all base equipment of equip_data_statistics, grouped by the wiki page they are shown on.
+	Equipment without wiki data gets its own page using the equip id.
+
+	:param types: only include equipment of these equipment types"""
+	equip_data_statistics = api.get_sharecfgmodule("equip_data_statistics")
+	pages = {}
+	for equip_id in sorted(int(i) for i in equip_data_statistics.all_ids(clients) if str(i).isdigit()):
+		equip_stats = equip_data_statistics.load_first(equip_id, clients)
+		# upgrade levels are part of the page of their base equipment
+		if not equip_stats or "base" in equip_stats:
+			continue
+		if types and equip_stats.type not in types:
+			continue
+		equip = api.equip_converter.from_equipid(equip_id)
+		key = (equip.gamename, equip.wikiname, equip.icon) if equip else equip_id
+		pages.setdefault(key, []).append(equip or equip_id)
+	return list(pages.values())
+
+def page_filename(equips: list[EquipConvertResult | int]) -> str:
+	equip = equips[0]
+	name = (equip.wikiname or equip.gamename) if isinstance(equip, EquipConvertResult) else str(equip)
+	return Utility.wikitext_filename(name)
+
+def generate_all(api: ALJsonAPI, clients: list[Client], output_directory: Path, types: Iterable[int] | None = None,
+		processes: int | None = None) -> None:
+	"""Generates the pages of all equipment and writes each one into *output_directory*."""
+	# load everything getGameData needs once, so the pool processes don't have to
+	for modulename in ["weapon_property", "barrage_template", "bullet_template", "aircraft_template", "equip_data_statistics",
+			"equip_data_template", "equip_upgrade_data", "skill_world_display", "skill_data_template", "name_code"]:
+		api.get_sharecfgmodule(modulename).preload(clients)
+	equip_upgrade_data = api.get_sharecfgmodule("equip_upgrade_data")
+	equip_upgrade_data.index_by("target_id", clients)
+	equip_upgrade_data.index_by("upgrade_from", clients)
+	# converters are only loaded on first access
+	api.equip_converter
+	api.ship_converter
+
+	pages = equip_pages(api, clients, types)
+	print(f"Generating {len(pages)} equipment pages...")
+	Utility.mkdir(output_directory)
+	failed = 0
+	for equips, wikitext, error in Utility.parallel_generate(api, clients, equip_wikitext, pages, processes, chunksize=4):
+		filename = page_filename(equips)
+		if error:
+			failed += 1
+			print(f"Failed to generate {filename}: {error}")
+			continue
+		with open(Path(output_directory, filename), 'w', encoding='utf8') as f:
+			f.write(wikitext)
+	print(f"Generated {len(pages)-failed} pages into {output_directory}, {failed} failed.")
+
 def main():
 	parser = ArgumentParser()
 	parser.add_argument("-c", "--clients", choices=Client.__members__, default = ['EN'], nargs = '+',
 						help="clients to gather information from (default: EN)")
-	parser.add_argument("-n", "--name", required=True, type=str,
+	mode = parser.add_mutually_exclusive_group(required=True)
+	mode.add_argument("-n", "--name", type=str,
 						help="name of the equip to get info for")
+	mode.add_argument("-a", "--all", action="store_true",
+						help="generate the pages of all equipment into the output directory")
+	parser.add_argument("-t", "--types", type=int, nargs='+', choices=equipment_types.keys(),
+						help="only generate pages for these equipment types (with --all)")
+	parser.add_argument("-o", "--output", type=Path, default=Path("output", "equip"),
+						help="directory the pages are written into (with --all)")
+	parser.add_argument("-p", "--processes", type=int, default=os.cpu_count(),
+						help="amount of processes used to generate the pages (with --all)")
 	args = parser.parse_args()
 
 	clients = [ Client[c] for c in args.clients ]
 	api = ALJsonAPI()
+	if args.all:
+		generate_all(api, clients, args.output, args.types, args.processes)
+		return
+
 	equip = api.equip_converter.from_wikiname(args.name)
 	if not equip:
 		equip = api.equip_converter.from_gamename(args.name)
@@ -719,24 +807,11 @@ def main():
 			else:
 				e = f'"{args.name}" is not a valid Equip name.'
 				raise ValueError(e)
-	equips = sorted((i for i in api.equip_converter.id_to_data.values() if equip.gamename == i.gamename and equip.wikiname == i.wikiname and equip.icon == i.icon), key = lambda x: x.id)
-	if len(equips) > 1:
-		wikitext = "<tabber>"
+	if isinstance(equip, int):
+		equips = [equip]
 	else:
-		wikitext = ''
-	for n,equip in enumerate(equips):
-		template_data_game = getGameData(equip, api, clients)
-		if not template_data_game:
-			print('No game data returned for this equip', equip)
-			continue
-		if wikitext:
-			wikitext += f"Type {template_data_game['Tech'][-1]}=\n"
-		equip_template = WikiHelper.MultilineTemplate("Equipment")
-		wikitext += equip_template.fill(template_data_game)
-		if n+1<len(equips):
-			wikitext += "\n|-|"
-	if len(equips) > 1:
-		wikitext += '\n</tabber>'
+		equips = sorted((i for i in api.equip_converter.id_to_data.values() if equip.gamename == i.gamename and equip.wikiname == i.wikiname and equip.icon == i.icon), key = lambda x: x.id)
+	wikitext = equip_wikitext(equips, api, clients)
 	Utility.output(wikitext)
 	#print(equip.id)
 
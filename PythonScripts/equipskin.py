@@ -54,8 +54,8 @@ def get_theme_from_id(client: Client, themeid: str | int) -> BackyardTheme:
 
 def get_theme_from_name(client: Client, themename: str) -> BackyardTheme:
 	equip_skin_theme_template = api.get_sharecfgmodule('equip_skin_theme_template')
-	for theme in equip_skin_theme_template.all_client(client):
-		if theme.name == themename:
+	for themeid in equip_skin_theme_template.index_by('name', client).get(themename, []):
+		if theme := equip_skin_theme_template.load_client(themeid, client):
 			return theme
 	raise ValueError(f"Equipment theme with name '{themename}' does not exist.")
 
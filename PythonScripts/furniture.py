@@ -90,9 +90,10 @@ class FurnitureQuery:
 
 		# search for more furniture items that are not directly referenced
 		# these are usually gem-only items
+		furniture_data_template = self.api.get_sharecfgmodule("furniture_data_template")
 		furniture_module = self.api.get_apimodule("furniture")
-		for furnitem in furniture_module.load_all(clients):
-			if furnitem.themeId == theme.id:
+		for furnid in furniture_data_template.index_by("themeId", clients).get(theme.id, []):
+			if furnitem := furniture_module.load_first(furnid, clients):
 				theme_items[furnitem] = None
 
 		# convert all items to wikitext
@@ -104,8 +105,8 @@ class FurnitureQuery:
 
 	def get_themeid_from_name(self, name: str, clients: Iterable[Client]) -> int:
 		backyard_theme_template = self.api.get_sharecfgmodule("backyard_theme_template")
-		for theme in backyard_theme_template.load_all(clients):
-			if theme.name == name:
+		for themeid in backyard_theme_template.index_by("name", clients).get(name, []):
+			if theme := backyard_theme_template.load_first(themeid, clients):
 				return theme.id
 
 
@@ -14,6 +14,9 @@ EQUIP_WIKIDATA_PATH = Path("data", "dynamic", "equip_wikinames.json")
 SKIN_WIKIDATA_PATH = Path("data", "dynamic", "skin_wikidata.json")
 AUGMENT_CONVERT_CACHE_PATH = Path("data", "dynamic", "augment_convert.json")
 
+# cache files (rebuilt automatically)
+TASK_INDEX_CACHE_PATH = Path("data", "cache", "task_index")
+
 
 class Rarity(Enum):
 	"""
@@ -1,6 +1,9 @@
+import re
 import sys
+import multiprocessing as mp
+from multiprocessing.context import BaseContext
 from os import PathLike
-from typing import Any, MutableSequence
+from typing import Any, Callable, Iterable, Iterator, MutableSequence
 from pathlib import Path
 
 
@@ -11,6 +14,58 @@ def rreplace(s: str, old: str, new: str, occurrence: int) -> str:
 	li = s.rsplit(old, occurrence)
 	return new.join(li)
 
+def fork_context() -> BaseContext | None:
+	"""
+	Returns the "fork" multiprocessing context, so pool processes share all data already loaded by the
+	parent process (copy-on-write) instead of unpickling or loading it again. The default start method
+	is not used, since it is spawn on Windows and macOS and forkserver on Linux since Python 3.14.
+	Returns None on platforms without fork (Windows), where pool processes have to load their data themselves.
+	"""
+	if "fork" in mp.get_all_start_methods():
+		return mp.get_context("fork")
+
+# set before forking the pool processes of parallel_generate, which inherit them including all preloaded module data
+_worker_api = None
+_worker_clients: list = []
+_worker_func: Callable | None = None
+
+def _init_worker(api, clients: list, func: Callable) -> None:
+	"""Sets the worker globals, without an *api* (when the pool can not fork) every process creates its own one."""
+	global _worker_api, _worker_clients, _worker_func
+	if api is None:
+		from . import ALJsonAPI
+		api = ALJsonAPI()
+	_worker_api, _worker_clients, _worker_func = api, clients, func
+
+def _generate(item) -> tuple[Any, Any, str | None]:
+	try:
+		return item, _worker_func(item, _worker_api, _worker_clients), None
+	except Exception as e:
+		return item, None, f"{type(e).__name__}: {e}"
+
+def parallel_generate(api, clients: list, func: Callable, items: Iterable, processes: int | None = None,
+		chunksize: int = 1) -> Iterator[tuple[Any, Any, str | None]]:
+	"""
+	Calls *func* with every item of *items*, the *api* and the *clients* in a pool of *processes* and yields
+	(item, result, None) in the order the results are done, or (item, None, error message) if *func* raised.
+	*func* has to be a module level function, so it can be passed to processes that are not forked.
+	"""
+	if context := fork_context():
+		_init_worker(api, clients, func)
+		pool = context.Pool(processes=processes)
+	else:
+		# the api is not passed to the pool processes, since pickling all preloaded data is slower than loading it again
+		pool = mp.Pool(processes=processes, initializer=_init_worker, initargs=(None, clients, func))
+	with pool:
+		yield from pool.imap_unordered(_generate, items, chunksize=chunksize)
+
+def wikitext_filename(name: str) -> str:
+	"""
+	Returns the name of the file the wikitext of the page *name* is written into, replacing characters
+	that are not allowed in filenames.
+	"""
+	return re.sub(r'[\\/:*?"<>|]', '_', name) + ".wikitext"
+
 def mkdir(directory: Path) -> None:
 	"""
 	faster than simply calling os.makedirs with exists_ok=True
@@ -6,6 +6,8 @@ from . import Constants
 
 # filepath for wikiclient settings
 WIKICLIENT_SETTINGS_PATH = Path("data", "static", "wiki_settings.json")
+# directory of the local wiki page cache
+WIKI_PAGE_CACHE_PATH = Path("data", "cache", "wiki_pages")
 
 # convert item names to wiki filenames
 itemname_convertpath = Constants.ITEMNAME_OVERRIDES_PATH
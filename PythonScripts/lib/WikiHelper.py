@@ -1,19 +1,146 @@
-import re, json, time
+import re, json, time, random, threading
 from pathlib import Path
+from urllib.parse import quote
 from typing import Any, Callable
+from itertools import batched
+from functools import partial
+from collections.abc import Iterable, Container
 from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 import mwclient
+import requests
+import mwparserfromhell
 from mwclient import APIError
 
 from . import ALJsonAPI, WikiConstants
 from .apiclasses import Awardable, EquipStat, Item, ShipReward, Furniture
 
 
+class TokenBucket():
+	"""
+	Thread-safe rate limiter that allows *rate* acquisitions per second on average
+	and bursts of up to *burst* acquisitions without waiting.
+
+	The rate adapts to the server: it is halved on every rate limit response down to *min_rate*
+	and slowly increased again with every successful request up to the configured *rate*.
+	"""
+	def __init__(self, rate: float, burst: int = 1, min_rate: float | None = None):
+		self.max_rate = rate
+		self.min_rate = min_rate or rate/16
+		self.rate = rate
+		self.burst = burst
+		self._tokens = float(burst)
+		self._last_refill = time.monotonic()
+		self._paused_until = 0.0
+		self._lock = threading.Lock()
+
+	def acquire(self) -> float:
+		"""
+		Takes a token, waiting until one is available and any pause is over. Returns the time waited in seconds.
+		"""
+		with self._lock:
+			now = time.monotonic()
+			self._tokens = min(self.burst, self._tokens + (now-self._last_refill)*self.rate)
+			self._last_refill = now
+			# the token is reserved immediately, so waiting threads queue up in order
+			self._tokens -= 1
+			wait_time = -self._tokens/self.rate if self._tokens < 0 else 0.0
+			wait_time = max(wait_time, self._paused_until-now)
+		if wait_time:
+			time.sleep(wait_time)
+		return wait_time
+
+	def pause(self, seconds: float) -> None:
+		"""
+		Blocks all acquisitions for *seconds*, e.g. when the server requests to retry after some time.
+		"""
+		with self._lock:
+			self._paused_until = max(self._paused_until, time.monotonic()+seconds)
+
+	def slow_down(self) -> None:
+		with self._lock:
+			self.rate = max(self.min_rate, self.rate/2)
+
+	def speed_up(self) -> None:
+		with self._lock:
+			self.rate = min(self.max_rate, self.rate + self.max_rate/20)
+
+
+@dataclass
+class RateLimitMetrics():
+	"""
+	Counters of the requests executed by a WikiClient.
+	"""
+	requests: int = 0
+	retries: int = 0
+	throttled_seconds: float = 0.0
+	"""Time spent waiting for the rate limiter, including backoff after rate limit responses."""
+	working_seconds: float = 0.0
+	"""Time spent executing requests."""
+	_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+	def record(self, throttled: float = 0.0, working: float = 0.0, retry: bool = False) -> None:
+		with self._lock:
+			self.throttled_seconds += throttled
+			self.working_seconds += working
+			if retry:
+				self.retries += 1
+			else:
+				self.requests += 1
+
+	def __str__(self) -> str:
+		return (f"{self.requests} requests, {self.retries} retries, "
+			f"{self.working_seconds:.1f}s working, {self.throttled_seconds:.1f}s throttled")
+
+
+class WikiEditError(Exception):
+	"""
+	Exception thrown when the wiki does not save an edit, e.g. because of an abuse filter or a captcha.
+	"""
+
+class RateLimitError(Exception):
+	"""
+	Raised by WikiClient.execute if a request is still rejected after the maximum amount of retries.
+	"""
+
+MAXLAG_RE = re.compile(r'(\d+(?:\.\d+)?) seconds? lagged')
+
+@dataclass
+class WikiPage():
+	"""
+	Wikitext of a page fetched by WikiClient.fetch_pages.
+	Mirrors the parts of mwclient pages used by the scripts, so both can be used interchangeably.
+	"""
+	name: str
+	wikitext: str | None
+	"""Wikitext of the latest revision, None if the page does not exist."""
+	revision: int | None = None
+
+	@property
+	def exists(self) -> bool:
+		return self.wikitext is not None
+
+	def text(self) -> str:
+		return self.wikitext or ''
+
+
 class WikiClient():
-	def __init__(self, execution_delay: float = 1.5, settings_path: Path = WikiConstants.WIKICLIENT_SETTINGS_PATH):
+	def __init__(self, execution_delay: float = 1.5, settings_path: Path = WikiConstants.WIKICLIENT_SETTINGS_PATH,
+			burst: int = 1, max_retries: int = 6, max_backoff: float = 120.0, maxlag: int = 5):
+		"""
+		execution_delay - minimum average delay between requests in seconds  
+		burst - amount of requests that can be executed at once without delay  
+		max_retries - how often a request is retried after a rate limit or lag response before giving up  
+		max_backoff - maximum delay in seconds before retrying a request  
+		maxlag - maximum replication lag in seconds before the wiki rejects requests
+		"""
 		self.settings_path = settings_path
 		self.execution_delay = execution_delay
-		self.last_execute_time = 0.0
+		self.max_retries = max_retries
+		self.max_backoff = max_backoff
+		# shared by all threads using this client
+		self.rate_limiter = TokenBucket(1/execution_delay, burst)
+		self.metrics = RateLimitMetrics()
 
 		### INIT MWCLIENT ###
 		print('reading wiki settings ...')
@@ -30,7 +157,7 @@ class WikiClient():
 			}
 			self.save_settings(settings)
 			print('Settings file created.')
-		self.mwclient = mwclient.Site(settings['url'], clients_useragent=settings['useragent'])
+		self.mwclient = mwclient.Site(settings['url'], clients_useragent=settings['useragent'], max_lag=maxlag)
 		self.settings = settings
 		self.logged_in = False
 
@@ -59,24 +186,273 @@ class WikiClient():
 		print('Logged in.')
 		return self
 
+	def _retry_delay(self, error: Exception) -> float | None:
+		"""
+		Returns how long to wait before retrying after *error*, based on the response if possible.
+		Returns 0 if the response does not specify a delay, and None if the request should not be retried.
+		"""
+		if isinstance(error, APIError):
+			if error.code == 'ratelimited':
+				self.rate_limiter.slow_down()
+				return 0
+			if error.code == 'maxlag':
+				match = MAXLAG_RE.search(str(error.info))
+				return float(match.group(1)) if match else 0
+		elif isinstance(error, requests.HTTPError) and error.response is not None:
+			if error.response.status_code in (429, 503):
+				if error.response.status_code == 429:
+					self.rate_limiter.slow_down()
+				retry_after = error.response.headers.get('Retry-After', '')
+				return float(retry_after) if retry_after.isdigit() else 0
+
 	def execute(self, func: Callable, *args, **kwargs):
-		delta_last_execute = time.time() - self.last_execute_time
-		if delta_last_execute < self.execution_delay:
-			time.sleep(delta_last_execute)
-
-		try:
-			result = func(*args, **kwargs)
-		except APIError as error:
-			if error.code == "ratelimited":
-				exec_delay_saved = self.execution_delay
-				self.execution_delay = (self.execution_delay+5)*2
-				result = self.execute(func, *args, **kwargs)
-				self.execution_delay = exec_delay_saved
+		"""
+		Executes *func*, which should do a single request to the wiki, once the rate limiter allows it.
+		Requests rejected because of rate limits or replication lag are retried with exponential backoff,
+		waiting at least as long as the wiki requests.
+		"""
+		for attempt in range(self.max_retries+1):
+			throttled = self.rate_limiter.acquire()
+			start = time.monotonic()
+			try:
+				result = func(*args, **kwargs)
+			except (APIError, requests.HTTPError) as error:
+				self.metrics.record(throttled, time.monotonic()-start, retry=True)
+				retry_delay = self._retry_delay(error)
+				if retry_delay is None:
+					raise error
+				if attempt == self.max_retries:
+					raise RateLimitError(f"Request failed after {attempt+1} attempts.") from error
+
+				backoff = min(self.max_backoff, self.execution_delay * 2**(attempt+1))
+				self.rate_limiter.pause(max(retry_delay, backoff) * random.uniform(1.0, 1.5))
+				# files passed for uploads have to be read again
+				for arg in (*args, *kwargs.values()):
+					if hasattr(arg, 'seek'):
+						arg.seek(0)
+				continue
+
+			self.metrics.record(throttled, time.monotonic()-start)
+			self.rate_limiter.speed_up()
+			return result
+
+	def fetch_pages(self, titles: Iterable[str], batch_size: int = 50) -> dict[str, WikiPage]:
+		"""
+		Returns the latest wikitext of all pages with *titles*, fetching up to *batch_size* pages with a single request.
+		The returned dict uses the titles as given, even if the wiki normalizes them.
+		"""
+		pages = {}
+		for batch in batched(titles, batch_size):
+			# the wiki limits the content size of a response, the remaining revisions are returned after continuing
+			continue_params = {}
+			while True:
+				response = self.execute(self.mwclient.api, 'query', prop='revisions', rvprop='ids|content', rvslots='main',
+					titles='|'.join(batch), formatversion=2, **continue_params)
+				result = response['query']
+				normalized = {entry['to']: entry['from'] for entry in result.get('normalized', [])}
+				for pagedata in result.get('pages', []):
+					title = normalized.get(pagedata['title'], pagedata['title'])
+					if pagedata.get('missing'):
+						pages[title] = WikiPage(title, None)
+					elif pagedata.get('revisions'):
+						revision = pagedata['revisions'][0]
+						pages[title] = WikiPage(title, revision['slots']['main']['content'], revision['revid'])
+				if 'continue' not in response:
+					break
+				continue_params = response['continue']
+		return pages
+
+	def save_page(self, title: str, wikitext: str, summary: str = '', baserevid: int | None = None) -> None:
+		"""
+		Saves *wikitext* as new content of the page with *title*, without fetching the page first.
+		*baserevid* is the revision the new wikitext is based on, if the page has been edited since then,
+		the wiki rejects the edit as edit conflict. Without it, the page is only created if it does not exist yet.
+		Raises WikiEditError if the wiki did not save the edit.
+		"""
+		conflict_check = {'baserevid': baserevid} if baserevid else {'createonly': True}
+		result = self.execute(self.mwclient.post, 'edit', title=title, text=wikitext, summary=summary,
+			token=self.mwclient.get_token('csrf'), **conflict_check)
+		edit = result.get('edit', {})
+		if edit.get('result') != 'Success':
+			raise WikiEditError(f"Edit of '{title}' was not saved: {edit}")
+
+	def update_pages(self, titles: Iterable[str], generate: Callable[[WikiPage], str | None],
+			summary: str | Callable[[WikiPage], str] = '', output_directory: Path | None = None,
+			workers: int = 4, batch_size: int = 50, page_cache: 'WikiPageCache | None' = None) -> dict[str, bool]:
+		"""
+		Fetches the pages with *titles* in batches and passes each one to *generate*, which returns the new wikitext
+		or None if the page should be left unchanged. The new wikitext is saved to the wiki with *summary*,
+		or written into *output_directory* if it is set.
+		With a *page_cache*, pages are read through it, so only pages with a newer revision are downloaded again.
+
+		Fetching and saving runs in a pool of *workers* threads, so the next batch of pages is fetched while the current
+		one is generated. *generate* always runs on the calling thread, since loading game data is not thread-safe.
+		All requests are rate limited by the client's shared rate limiter, pages are saved with the revision
+		they have been fetched at, so edits made in the meantime are not overwritten.
+		Returns whether updating succeeded for each title.
+		"""
+		def store(page: WikiPage, wikitext: str, page_summary: str) -> bool:
+			if output_directory:
+				output_path = Path(output_directory, page.name.replace('/', '_')+'.wikitext')
+				output_path.parent.mkdir(parents=True, exist_ok=True)
+				with open(output_path, 'w', encoding='utf8') as f:
+					f.write(wikitext)
 			else:
-				raise error
-
-		self.last_execute_time = time.time()
-		return result
+				self.save_page(page.name, wikitext, page_summary, page.revision)
+			return True
+
+		results = {}
+		pending: dict[Future, str] = {}
+		def collect(done: set[Future]) -> None:
+			for future in done:
+				title = pending.pop(future)
+				try:
+					results[title] = future.result()
+				except Exception as error:
+					print(f"Failed to update '{title}': {type(error).__name__}: {error}")
+					results[title] = False
+
+		with ThreadPoolExecutor(workers) as executor:
+			batches = list(batched(titles, batch_size))
+			fetch_pages = page_cache.get_pages if page_cache else partial(self.fetch_pages, batch_size=batch_size)
+			fetching = executor.submit(fetch_pages, batches[0]) if batches else None
+			for i, batch in enumerate(batches):
+				try:
+					pages = fetching.result()
+				except Exception as error:
+					print(f"Failed to fetch {len(batch)} pages starting with '{batch[0]}': {type(error).__name__}: {error}")
+					pages = None
+				if i+1 < len(batches):
+					fetching = executor.submit(fetch_pages, batches[i+1])
+				if pages is None:
+					results.update(dict.fromkeys(batch, False))
+					continue
+
+				for title in batch:
+					page = pages.get(title, WikiPage(title, None))
+					try:
+						wikitext = generate(page)
+						page_summary = summary(page) if callable(summary) else summary
+					except Exception as error:
+						print(f"Failed to update '{title}': {type(error).__name__}: {error}")
+						results[title] = False
+						continue
+					if wikitext is None:
+						results[title] = False
+						continue
+					pending[executor.submit(store, page, wikitext, page_summary)] = title
+					# keep at most one batch of saves queued, so generating does not run too far ahead of saving
+					while len(pending) > batch_size:
+						done, _ = wait(pending, return_when=FIRST_COMPLETED)
+						collect(done)
+			collect(wait(pending).done)
+		return results
+
+
+class WikiPageCache():
+	"""
+	Local cache of wiki pages inside *directory*, storing the wikitext, revision id
+	and parsed templates of every page as a json file named after the page title.
+
+	Cached pages are revalidated once per run with a batched query of their latest revision ids
+	and only downloaded again if they changed. With *wikiclient* set to None, the cache is used offline
+	and pages that are not cached are treated as missing.
+	"""
+	def __init__(self, wikiclient: WikiClient | None, directory: Path = WikiConstants.WIKI_PAGE_CACHE_PATH,
+			revalidate: bool = True):
+		self.wikiclient = wikiclient
+		self.directory = directory
+		self.revalidate = revalidate
+		self._entries: dict[str, dict] = {}
+		self._validated: set[str] = set()
+		self._lock = threading.Lock()
+
+	def _path(self, title: str) -> Path:
+		return Path(self.directory, quote(title, safe=' ')+'.json')
+
+	def _read(self, title: str) -> dict | None:
+		if title not in self._entries:
+			path = self._path(title)
+			if not path.exists():
+				return
+			with open(path, 'r', encoding='utf8') as f:
+				self._entries[title] = json.load(f)
+		return self._entries[title]
+
+	def _write(self, entry: dict) -> None:
+		self._entries[entry['title']] = entry
+		path = self._path(entry['title'])
+		path.parent.mkdir(parents=True, exist_ok=True)
+		with open(path, 'w', encoding='utf8') as f:
+			json.dump(entry, f, ensure_ascii=False)
+
+	def _latest_revisions(self, titles: list[str], batch_size: int = 50) -> dict[str, int | None]:
+		revisions = {}
+		for batch in batched(titles, batch_size):
+			result = self.wikiclient.execute(self.wikiclient.mwclient.api, 'query', prop='info',
+				titles='|'.join(batch), formatversion=2)['query']
+			normalized = {entry['to']: entry['from'] for entry in result.get('normalized', [])}
+			for pagedata in result.get('pages', []):
+				title = normalized.get(pagedata['title'], pagedata['title'])
+				revisions[title] = None if pagedata.get('missing') else pagedata.get('lastrevid')
+		return revisions
+
+	def store(self, page) -> WikiPage:
+		"""
+		Adds a page that has been fetched elsewhere to the cache. Works with WikiPage and mwclient pages.
+		"""
+		wikitext = page.text() if page.exists else None
+		revision = page.revision if page.exists else None
+		with self._lock:
+			entry = self._read(page.name)
+			if entry is None or entry['revision'] != revision or entry['wikitext'] != wikitext:
+				self._write({'title': page.name, 'revision': revision, 'wikitext': wikitext, 'templates': None})
+			self._validated.add(page.name)
+		return WikiPage(page.name, wikitext, revision)
+
+	def get_pages(self, titles: Iterable[str]) -> dict[str, WikiPage]:
+		"""
+		Returns the pages with *titles*, only downloading pages that are not cached or have a newer revision.
+		"""
+		titles = list(titles)
+		with self._lock:
+			unvalidated = [title for title in titles if title not in self._validated]
+			if self.wikiclient and unvalidated:
+				outdated = [title for title in unvalidated if self._read(title) is None]
+				if self.revalidate:
+					cached = [title for title in unvalidated if title not in outdated]
+					for title, revision in self._latest_revisions(cached).items():
+						if self._read(title)['revision'] != revision:
+							outdated.append(title)
+
+				for title, page in self.wikiclient.fetch_pages(outdated).items():
+					self._write({'title': title, 'revision': page.revision, 'wikitext': page.wikitext, 'templates': None})
+				self._validated.update(unvalidated)
+
+			pages = {}
+			for title in titles:
+				entry = self._read(title) or {'revision': None, 'wikitext': None}
+				pages[title] = WikiPage(title, entry['wikitext'], entry['revision'])
+			return pages
+
+	def get_page(self, title: str) -> WikiPage:
+		return self.get_pages([title])[title]
+
+	def templates(self, title: str) -> list[tuple[str, dict[str, str]]]:
+		"""
+		Returns the name and parameters of all templates on the page with *title*, including nested ones.
+		Templates are only parsed once per revision of a page and version of the template parser.
+		"""
+		page = self.get_page(title)
+		if not page.exists:
+			return []
+		with self._lock:
+			entry = self._read(title)
+			if entry['templates'] is None or entry.get('templates_version') != TEMPLATE_PARSER_VERSION:
+				entry['templates'] = parse_templates(page.wikitext)
+				entry['templates_version'] = TEMPLATE_PARSER_VERSION
+				self._write(entry)
+			return [(name, dict(params)) for name, params in entry['templates']]
 
 
 def simple_template(name: str, params: list) -> str:
@@ -159,16 +535,123 @@ def remove_comments(wikitext: str) -> str:
 	b, _ = COMMENT_PART.subn('', a)
 	return b
 
-PARAMS_RE = re.compile(r'\n\ *\|')
+class TemplateSyntaxError(ValueError):
+	pass
+
+# stored with parsed templates in the wiki page cache, has to be increased when the parsing results change
+TEMPLATE_PARSER_VERSION = 3
+TEMPLATE_TOKEN_RE = re.compile(r'<!--|(?i:<(nowiki|pre)(?:\s[^>]*)?(?<!/)>)|\{\{\{|\}\}\}|\{\{|\}\}|\[\[|\]\]|\|')
+def extract_templates(wikitext: str, names: Container[str] | None = None,
+		do_remove_comments: bool = True) -> list[tuple[str, dict[str, str]]]:
+	"""
+	Returns the name and named parameters of all templates in *wikitext*, optionally only those with *names*.
+	Templates nested inside other templates (e.g. inside {{#tag:tabber|...}}) follow their parent template,
+	in the same order as mwparserfromhell's filter_templates returns them.
+	Scans the brackets of templates, template arguments and links, so parameters are only split at pipes
+	belonging to the template itself. Comments and the content of <nowiki> and <pre> tags are not scanned.
+
+	Raises TemplateSyntaxError if the brackets do not match.
+	"""
+	templates = []
+	stack = []
+	start = 0
+	pipes = []
+	pos = 0
+	while match := TEMPLATE_TOKEN_RE.search(wikitext, pos):
+		token = match.group()
+		pos = match.end()
+		if token == '<!--':
+			end = wikitext.find('-->', pos)
+			pos = len(wikitext) if end == -1 else end+3
+			continue
+		if tag := match.group(1):
+			# unclosed tags are kept as text, like the wiki does
+			if end := re.compile(f'</{tag}\\s*>', re.I).search(wikitext, pos):
+				pos = end.end()
+			continue
+
+		if not stack:
+			# outside of templates only the start of the next template is relevant
+			if token in ('{{', '{{{'):
+				start = match.start()
+				stack.append(token)
+				pipes = []
+			continue
+
+		if token == '|':
+			if len(stack) == 1:
+				pipes.append(match.start())
+		elif token in ('{{', '{{{', '[['):
+			stack.append(token)
+		else:
+			opening = stack.pop()
+			if token == '}}}' and opening == '{{':
+				# closing brackets of a template followed by a single brace
+				pos -= 1
+				token = '}}'
+			if {'}}': '{{', '}}}': '{{{', ']]': '[['}[token] != opening:
+				raise TemplateSyntaxError(f'Unexpected {token} at position {match.start()}, expected closing of {opening}.')
+			if stack: continue
+			if opening == '{{':
+				name, params = _split_template(wikitext, start, pos, pipes, names, do_remove_comments)
+				if params is not None:
+					templates.append((name, params))
+			# the content of the template or template argument is scanned again for nested templates
+			inner = wikitext[start+len(opening):pos-len(opening)]
+			if '{{' in inner:
+				templates.extend(extract_templates(inner, names, do_remove_comments))
+	if stack:
+		raise TemplateSyntaxError(f'Unclosed {stack[-1]} of template starting at position {start}.')
+	return templates
+
+def _split_template(wikitext: str, start: int, end: int, pipes: list[int], names: Container[str] | None,
+		do_remove_comments: bool) -> tuple[str, dict[str, str] | None]:
+	bounds = [start+2] + [pipe+1 for pipe in pipes]
+	ends = pipes + [end-2]
+	name = remove_comments(wikitext[bounds[0]:ends[0]]).strip()
+	if names is not None and name not in names:
+		return name, None
+
+	params = {}
+	for param_start, param_end in zip(bounds[1:], ends[1:]):
+		param = wikitext[param_start:param_end]
+		if do_remove_comments and '<!--' in param:
+			param = remove_comments(param)
+		# only named parameters are kept, the name can not contain templates or links
+		eq = param.find('=')
+		if eq == -1 or '{{' in param[:eq] or '[[' in param[:eq]: continue
+		params[param[:eq].strip()] = param[eq+1:].strip()
+	return name, params
+
+def _parse_templates_fallback(wikitext: str, names: Container[str] | None,
+		do_remove_comments: bool) -> list[tuple[str, dict[str, str]]]:
+	templates = []
+	for template in mwparserfromhell.parse(wikitext).filter_templates(recursive=True):
+		name = remove_comments(str(template.name)).strip()
+		if names is not None and name not in names: continue
+		params = {}
+		for param in template.params:
+			if not param.showkey: continue
+			value = str(param.value)
+			if do_remove_comments: value = remove_comments(value)
+			params[str(param.name).strip()] = value.strip()
+		templates.append((name, params))
+	return templates
+
+def parse_templates(wikitext: str, names: Container[str] | None = None,
+		do_remove_comments: bool = True) -> list[tuple[str, dict[str, str]]]:
+	"""
+	Same as extract_templates, but uses mwparserfromhell for wikitext the bracket scanner can not handle.
+	"""
+	try:
+		return extract_templates(wikitext, names, do_remove_comments)
+	except TemplateSyntaxError:
+		return _parse_templates_fallback(wikitext, names, do_remove_comments)
+
 def parse_multiline_template(wikitext: str, do_remove_comments: bool = True) -> dict[str, str]:
-	if do_remove_comments: wikitext = remove_comments(wikitext)
-	template = {}
-	params = PARAMS_RE.split(wikitext[2:-2])
-	for param in params:
-		if '=' in param:
-			key, value = param.split('=', 1)
-			template[key.strip()] = value.strip()
-	return template
+	"""Returns the named parameters of the first template in *wikitext*."""
+	templates = parse_templates(wikitext, do_remove_comments=do_remove_comments)
+	return templates[0][1] if templates else {}
 
 def put_icon(filename: str, itemname: str = '', size: str = 'x22px', nolink: bool = False) -> str:
 	nolinkstr = 'link=' if nolink else ''
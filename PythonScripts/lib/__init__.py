@@ -1,8 +1,8 @@
 import re
 from pathlib import Path
 
-from .api import Client, JsonLoader, nobbyfix_JsonLoader, AzurLaneTools_JsonLoader, Module, ApiModule, SharecfgModule
-from . import settings, apimodules, sharecfgmodules, Constants
+from .api import Client, JsonLoader, nobbyfix_JsonLoader, AzurLaneTools_JsonLoader, Module, ApiModule, SharecfgModule, CacheBudget
+from . import settings, apimodules, sharecfgmodules, sharecfgcache, Constants
 from .converter import ships, equips, augments
 
 
@@ -15,6 +15,11 @@ jsonloaders = {
 	"AzurLaneTools": AzurLaneTools_JsonLoader,
 }
 
+cacheloaders = {
+	"binary": sharecfgcache.BinaryCache_JsonLoader,
+	"mmap": sharecfgcache.Mmap_JsonLoader,
+}
+
 
 class UnknownModuleError(Exception):
 	"""
@@ -28,16 +33,22 @@ class ALJsonAPI:
 	_apimodules: dict[str, ApiModule]
 	_sharecfgmodules: dict[str, SharecfgModule]
 	loader: JsonLoader
+	cache_budget: CacheBudget | None
 	apisettings: settings.APISettings
 	ship_converter: ships.ShipIDConverter
 	equip_converter: equips.EquipConverter
 	augment_converter: augments.AugmentConverter
 
-	def __init__(self, loader: JsonLoader | None = None, source_path: Path | None = None, settings_path: Path | None = None) -> None:
+	def __init__(self, loader: JsonLoader | None = None, source_path: Path | None = None, settings_path: Path | None = None,
+			cache_budget: CacheBudget | None = None) -> None:
 		"""
-		Initializes the JsonAPI. Uses the JsonLoader as set in the settings file at "data/settings.toml".
+		Initializes the JsonAPI. Uses the JsonLoader as set in the settings file at "data/settings.toml",
+		wrapped by the sharecfg cache loader if one is set there.
 		Path of the settings file can be overridden using *settings_path*.
 		For usage of a different/custom JsonLoader, *loader* can be set, which will ignore the settings file.
+
+		The memory used by cached module data can be limited using *cache_budget*,
+		otherwise the budget set in the settings file is used.
 		"""
 		if source_path:
 			raise DeprecationWarning("Initialisation of ALJsonAPI using 'source_path' should be removed.")
@@ -50,7 +61,14 @@ class ALJsonAPI:
 			else:
 				self.apisettings = settings.read_and_parse_settings()
 			self.loader = jsonloaders[self.apisettings.jsonloader_variant](self.apisettings.json_source_path)
-
+			if cacheloader := cacheloaders.get(self.apisettings.sharecfg_cache):
+				self.loader = cacheloader(self.loader, self.apisettings.sharecfg_cache_path)
+			if not cache_budget and (self.apisettings.cache_budget_mb or self.apisettings.cache_budget_datasets):
+				cache_budget = CacheBudget(self.apisettings.cache_budget_datasets, self.apisettings.cache_budget_mb,
+					self.apisettings.cache_pinned_modules)
+
+		self.cache_budget = cache_budget
+		self.loader.attach_cache_budget(cache_budget)
 		self._apimodules = {}
 		self._sharecfgmodules = {}
 
@@ -125,6 +143,7 @@ class ALJsonAPI:
 		module = self._load_apimodule(name) if is_api else self._load_sharecfgmodule(name)
 
 		# put the module instance into the cache and return it
+		module.attach_cache_budget(self.cache_budget, name)
 		used_cache[name] = module
 		return module
 
@@ -137,6 +156,13 @@ class ALJsonAPI:
 	def get_module(self, name: str) -> Module:
 		return self.get_sharecfgmodule(name) or self.get_apimodule(name)
 
+	def pin_module(self, name: str) -> None:
+		"""
+		Prevents the cached data of the module called *name* from being evicted by the cache budget.
+		"""
+		if self.cache_budget:
+			self.cache_budget.pin(name)
+
 	### Additional Api Methods
 
 	def replace_namecode(self, inputstring: str, client: Client) -> str:
@@ -1,6 +1,8 @@
 import json
 from pathlib import Path
 from enum import Enum
+from functools import partial
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from abc import ABCMeta, abstractmethod
 from collections.abc import Iterable, Callable, Generator, Hashable
@@ -58,12 +60,120 @@ class Client(_Client):
 	TW = (5, True, 'zh-TW', 'com.hkmanjuu.azurlane.gp')
 
 
+class CacheBudget:
+	"""
+	Keeps track of the datasets cached by modules and json loaders in least recently used order.
+	A dataset is the entire cached data of a single module or gamecfg type for a single client.
+
+	If more than *max_datasets* datasets are cached or their combined size exceeds *max_mb* megabytes,
+	the least recently used datasets are evicted until the budget is met again.
+	The size of a dataset is estimated from the size of its json files.
+	Datasets of modules whose name is in *pinned* are never evicted.
+	"""
+	max_datasets: int | None
+	max_bytes: int | None
+	pinned: set[str]
+	evictions: int
+	"""Amount of datasets that have been evicted so far."""
+	_datasets: OrderedDict[Hashable, tuple[str, int, Callable[[], None]]]
+	_total_bytes: int
+
+	def __init__(self, max_datasets: int | None = None, max_mb: float | None = None, pinned: Iterable[str] = ()) -> None:
+		self.max_datasets = max_datasets or None
+		self.max_bytes = int(max_mb*1024*1024) if max_mb else None
+		self.pinned = set(pinned)
+		self.evictions = 0
+		self._datasets = OrderedDict()
+		self._total_bytes = 0
+
+	def __repr__(self) -> str:
+		return f"<{self.__class__.__name__}: {len(self._datasets)} datasets, {self._total_bytes/1024/1024:.1f} MB>"
+
+	@property
+	def datasets(self) -> int:
+		return len(self._datasets)
+
+	@property
+	def total_mb(self) -> float:
+		return self._total_bytes/1024/1024
+
+	def pin(self, name: str) -> None:
+		self.pinned.add(name)
+
+	def unpin(self, name: str) -> None:
+		self.pinned.discard(name)
+		self._enforce()
+
+	def touch(self, key: Hashable) -> bool:
+		"""
+		Marks the dataset with *key* as most recently used.
+		Returns False if the dataset is not tracked yet, so it has to be added.
+		"""
+		if key not in self._datasets:
+			return False
+		self._datasets.move_to_end(key)
+		return True
+
+	def add(self, key: Hashable, name: str, size: int, evict: Callable[[], None]) -> None:
+		"""
+		Starts tracking the dataset with *key* as most recently used and evicts older datasets if over budget.
+		*evict* is called without arguments to remove the dataset from its owner's cache.
+		"""
+		if key in self._datasets:
+			self.discard(key)
+		self._datasets[key] = (name, size, evict)
+		self._total_bytes += size
+		self._enforce()
+
+	def grow(self, key: Hashable, size: int) -> None:
+		"""
+		Adds *size* to the size of the tracked dataset with *key*, e.g. after loading sublist files.
+		"""
+		if dataset := self._datasets.get(key):
+			name, dataset_size, evict = dataset
+			self._datasets[key] = (name, dataset_size+size, evict)
+			self._total_bytes += size
+			self._enforce()
+
+	def discard(self, key: Hashable) -> None:
+		"""
+		Stops tracking the dataset with *key* without evicting it.
+		"""
+		if dataset := self._datasets.pop(key, None):
+			self._total_bytes -= dataset[1]
+
+	def _is_over_budget(self) -> bool:
+		if self.max_datasets and len(self._datasets) > self.max_datasets:
+			return True
+		return bool(self.max_bytes and self._total_bytes > self.max_bytes)
+
+	def _enforce(self) -> None:
+		# the most recently used dataset is never evicted, since it is still being used
+		for key in list(self._datasets)[:-1]:
+			if not self._is_over_budget():
+				break
+			name, size, evict = self._datasets[key]
+			if name in self.pinned:
+				continue
+			del self._datasets[key]
+			self._total_bytes -= size
+			self.evictions += 1
+			evict()
+
+
 class JsonLoader(metaclass=ABCMeta):
 	"""
 	Abstract class providing an interface for loading sharecfg and gamecfg json files.
 	"""
 	source_directory: Path
 	""" The path to the directory containg the json source files. """
+	_budget: CacheBudget | None = None
+
+	def attach_cache_budget(self, budget: CacheBudget | None) -> None:
+		"""
+		Sets the CacheBudget used to evict data cached by the loader.
+		"""
+		self._budget = budget
 
 	def __init__(self, source_directory: Path) -> None:
 		"""
@@ -88,6 +198,18 @@ class JsonLoader(metaclass=ABCMeta):
 		client - the client to load the sharecfg file from
 		"""
 
+	def sharecfg_directory(self, client: Client) -> Path:
+		"""
+		Returns the directory containing the sharecfg json files of *client*.
+		"""
+		raise NotImplementedError(f"{self.__class__.__name__} does not store sharecfg files as json files.")
+
+	def sharecfg_path(self, sharecfg_name: str, client: Client) -> Path:
+		"""
+		Returns the path of the sharecfg json file that is loaded by load_sharecfg.
+		"""
+		return Path(self.sharecfg_directory(client), sharecfg_name+".json")
+
 	def load_multi_sharecfg(self, sharecfg_name: str, clients: Iterable[Client]) -> dict[Client, dict]:
 		"""
 		Returns the contents of multiple sharecfg json files as a dict with format {client: data},
@@ -195,9 +317,11 @@ class nobbyfix_JsonLoader(JsonLoader):
 	Implementation of the JsonLoader for this json repository:
 	https://github.com/nobbyfix/AzurLaneSourceJson
 	"""
+	def sharecfg_directory(self, client: Client) -> Path:
+		return Path(self.source_directory, client.name, "sharecfg")
+
 	def load_sharecfg(self, sharecfg_name: str, client: Client) -> dict:
-		jsonpath = Path(self.source_directory, client.name, "sharecfg", sharecfg_name+".json")
-		with open(jsonpath, "r", encoding="utf8") as f:
+		with open(self.sharecfg_path(sharecfg_name, client), "r", encoding="utf8") as f:
 			return json.load(f)
 
 	def load_sharecfgdata(self, sharecfg_name: str, client: Client) -> dict:
@@ -219,9 +343,14 @@ class AzurLaneTools_JsonLoader(JsonLoader):
 		super().__init__(source_directory)
 		self._gamecfg_cache = {c: {} for c in Client}
 
+	def _evict_gamecfg(self, gamecfg_type: str, client: Client) -> None:
+		self._gamecfg_cache[client].pop(gamecfg_type, None)
+
+	def sharecfg_directory(self, client: Client) -> Path:
+		return Path(self.source_directory, client.name, "ShareCfg")
+
 	def load_sharecfg(self, sharecfg_name: str, client: Client) -> dict:
-		jsonpath = Path(self.source_directory, client.name, "ShareCfg", sharecfg_name+".json")
-		with open(jsonpath, "r", encoding="utf8") as f:
+		with open(self.sharecfg_path(sharecfg_name, client), "r", encoding="utf8") as f:
 			return json.load(f)
 
 	def load_sharecfgdata(self, sharecfg_name: str, client: Client) -> dict:
@@ -244,6 +373,11 @@ class AzurLaneTools_JsonLoader(JsonLoader):
 			with open(jsonpath, "r", encoding="utf8") as f:
 				jsondata = json.load(f)
 			self._gamecfg_cache[client][gamecfg_type] = jsondata
+			if self._budget:
+				self._budget.add((id(self), client, gamecfg_type), gamecfg_type, jsonpath.stat().st_size,
+					partial(self._evict_gamecfg, gamecfg_type, client))
+		elif self._budget:
+			self._budget.touch((id(self), client, gamecfg_type))
 		return self._gamecfg_cache[client][gamecfg_type][gamecfg_name]
 
 
@@ -329,6 +463,35 @@ class MergedSharecfgData(ApiData):
 		return False
 
 
+_UNKNOWN = object()
+"""
+Sentinel returned by Module._load_from_cache if it is not known yet whether an entry exists.
+"""
+
+@dataclass
+class CacheStats:
+	"""
+	Counters of the cache lookups done by a module.
+	"""
+	hits: int = 0
+	"""Lookups returning a cached ApiData entry."""
+	negative_hits: int = 0
+	"""Lookups of ids that are already known to have no entry."""
+	misses: int = 0
+	"""Lookups that had to be resolved by loading the data."""
+
+	@property
+	def lookups(self) -> int:
+		return self.hits + self.negative_hits + self.misses
+
+	@property
+	def hit_rate(self) -> float:
+		return (self.hits + self.negative_hits) / self.lookups if self.lookups else 0.0
+
+	def reset(self) -> None:
+		self.hits = self.negative_hits = self.misses = 0
+
+
 @dataclass
 class Module(metaclass=ABCMeta):
 	"""
@@ -337,16 +500,55 @@ class Module(metaclass=ABCMeta):
 	All data requests return None if there is no entry for the dataid for the client.
 	"""
 	# cache to hold reference to parsed apidata so it doesn't have to be parsed again
+	# None values mark ids that are known to have no entry
 	_cache: dict[Client, dict[str, ApiData | None]] = field(default_factory=lambda: {c: {} for c in Client}, init=False, repr=False)
+	_cache_stats: CacheStats = field(default_factory=CacheStats, init=False, repr=False)
+	_budget: CacheBudget | None = field(default=None, init=False, repr=False)
+	_budget_name: str = field(default="", init=False, repr=False)
+
+	@property
+	def cache_stats(self) -> CacheStats:
+		"""
+		Returns the hit, negative hit and miss counters of the load_client cache.
+		"""
+		return self._cache_stats
 
-	def _load_from_cache(self, dataid: str, client: Client) -> ApiData | None:
+	def attach_cache_budget(self, budget: CacheBudget | None, name: str) -> None:
+		"""
+		Sets the CacheBudget used to evict the cached data of the module, which is pinned by *name*.
+		"""
+		self._budget = budget
+		self._budget_name = name
+
+	def _dataset_size(self, client: Client) -> int:
+		"""
+		Returns the estimated size in bytes of the data cached for *client*.
+		"""
+		return 0
+
+	def _evict_dataset(self, client: Client) -> None:
+		"""
+		Removes all data cached for *client*. Called by the CacheBudget.
+		"""
+		self._cache[client] = {}
+
+	def _use_dataset(self, client: Client) -> None:
+		"""
+		Marks the data cached for *client* as most recently used in the CacheBudget.
+		"""
+		if self._budget and not self._budget.touch((id(self), client)):
+			self._budget.add((id(self), client), self._budget_name, self._dataset_size(client),
+				partial(self._evict_dataset, client))
+
+	def _load_from_cache(self, dataid: str, client: Client) -> ApiData | None | object:
 		"""
 		Tries to load the ApiData entry associated with *dataid* from the cache for *client*.
-		If the client is not in the cache or there is no entry for *dataid* for *client*,
-		None is returned.
+		Returns None if *dataid* is known to have no entry for *client*
+		and the sentinel _UNKNOWN if it has not been loaded yet.
 		"""
 		if client in self._cache:
-			return self._cache[client].get(dataid)
+			return self._cache[client].get(dataid, _UNKNOWN)
+		return _UNKNOWN
 
 	@abstractmethod
 	def _load_client(self, dataid: str, client: Client) -> ApiData | None:
@@ -365,13 +567,21 @@ class Module(metaclass=ABCMeta):
 		"""
 		# convert to string, because the internal _load_client only takes strings as dataid
 		dataid = str(dataid)
-		# try to load from cache first, if None is returned load using internal loader method
-		if data := self._load_from_cache(dataid, client):
+		# try to load from cache first, only load using internal loader method if the id is unknown
+		data = self._load_from_cache(dataid, client)
+		if data is not _UNKNOWN:
+			if data is None:
+				self._cache_stats.negative_hits += 1
+			else:
+				self._cache_stats.hits += 1
+			self._use_dataset(client)
 			return data
-		
+
+		self._cache_stats.misses += 1
 		data = self._load_client(dataid, client)
-		# save to cache
+		# save to cache, including None so missing ids are not resolved again
 		self._cache[client][dataid] = data
+		self._use_dataset(client)
 		return data
 
 	@abstractmethod
@@ -462,6 +672,7 @@ class SharecfgModule(Module):
 	_data: dict[Client, dict] = field(default_factory=dict, init=False, repr=False)
 	_settings: SharecfgmoduleDataSettings = field(default_factory=SharecfgmoduleDataSettings, init=False)
 	_all_key_warning: bool = field(default=False, init=False, repr=False)
+	_indices: dict[tuple[str, tuple[Client, ...]], dict[Hashable, list[int | str]]] = field(default_factory=dict, init=False, repr=False)
 
 	def _load_data(self, client: Client) -> dict | None:
 		"""
@@ -485,9 +696,21 @@ class SharecfgModule(Module):
 					self._do_sharecfgdata_loading(client, jsondata)
 			except FileNotFoundError:
 				self._data[client] = None
+		self._use_dataset(client)
 		# return *client* json data for easier access in data loader methods
 		return self._data[client]
 
+	def _dataset_size(self, client: Client) -> int:
+		try:
+			return self._loader.sharecfg_path(self.name, client).stat().st_size
+		except (NotImplementedError, OSError):
+			return 0
+
+	def _evict_dataset(self, client: Client) -> None:
+		super()._evict_dataset(client)
+		self._data.pop(client, None)
+		self._indices = {key: index for key, index in self._indices.items() if client not in key[1]}
+
 	def _do_sharecfgdata_loading(self, client: Client, clientdata: dict) -> None:
 		if self._settings.is_sharecfgdata:
 			sharecfgdataname = clientdata["__name"]
@@ -532,6 +755,11 @@ class SharecfgModule(Module):
 					try:
 						sublist_jsondata = self._loader.load_sharecfg(sublistpath, client)
 						self._data[client] |= sublist_jsondata
+						if self._budget:
+							try:
+								self._budget.grow((id(self), client), self._loader.sharecfg_path(sublistpath, client).stat().st_size)
+							except (NotImplementedError, OSError):
+								pass
 						return self._data[client].get(dataid)
 					except FileNotFoundError:
 						print(f"Failed to load sublist '{sublistpath}' for module '{self.name}'.")
@@ -570,6 +798,57 @@ class SharecfgModule(Module):
 		if data := self._load_data(client):
 			return data.keys()
 
+	def preload(self, clients: Iterable[Client]) -> None:
+		"""
+		Loads the json data of *clients* including all sublists, so later requests do not have to load anything.
+		Useful before forking worker processes, which then share the loaded data.
+		"""
+		for client in clients:
+			if self._load_data(client) and self._settings.is_sublisted:
+				for dataid in self.all_client_ids(client) or []:
+					self._load(str(dataid), client)
+
+	def index_by(self, fieldname: str, clients: Client | Iterable[Client]) -> dict[Hashable, list[int | str]]:
+		"""
+		Returns a dict mapping every value of the field *fieldname* to the dataids of all entries with that value.
+		The index is built from the json data without instantiating any ApiData
+		and kept until the data of one of the *clients* is evicted.
+
+		Entries with a list value are indexed by each element of the list, unhashable values are skipped.
+		Leading and trailing whitespace is stripped from string values, same as for SharecfgData.
+		For multiple *clients*, each dataid is indexed by the value of the first client it exists in,
+		which matches the entries returned by Module.load_all.
+		"""
+		clients = (clients,) if isinstance(clients, Client) else tuple(clients)
+		if (fieldname, clients) not in self._indices:
+			self._indices[(fieldname, clients)] = self._build_index(fieldname, clients)
+		return self._indices[(fieldname, clients)]
+
+	def _build_index(self, fieldname: str, clients: tuple[Client, ...]) -> dict[Hashable, list[int | str]]:
+		if len(clients) == 1:
+			dataids = self.all_client_ids(clients[0]) or []
+		else:
+			dataids = self.all_ids(clients)
+
+		index = {}
+		for dataid in dataids:
+			data = None
+			for client in clients:
+				if data := self._load(str(dataid), client):
+					break
+			if not isinstance(data, dict) or fieldname not in data:
+				continue
+
+			value = data[fieldname]
+			for element in (value if isinstance(value, list) else [value]):
+				if isinstance(element, str):
+					element = element.strip()
+				if isinstance(element, Hashable):
+					entry_ids = index.setdefault(element, [])
+					if not entry_ids or entry_ids[-1] != dataid:
+						entry_ids.append(dataid)
+		return index
+
 
 @dataclass
 class ApiModule(Module, metaclass=ABCMeta):
@@ -1,6 +1,9 @@
+import re
 import json
 from os import PathLike
+from functools import cached_property
 from dataclasses import dataclass
+from collections.abc import Container
 
 
 @dataclass
@@ -23,6 +26,30 @@ class ShipIDConverter:
 		shipname = self.get_shipname(key)
 		return groupid or shipname
 
+	@cached_property
+	def name_pattern(self) -> re.Pattern:
+		"""Compiled regex matching any shipname as a whole word.
+		Longer names are preferred, so a name is not matched inside a longer one."""
+		if not self.ship_to_id:
+			return re.compile(r"(?!)")
+		names = sorted(self.ship_to_id, key=len, reverse=True)
+		return re.compile(r"\b(?:" + "|".join(map(re.escape, names)) + r")\b")
+
+	def link_shipnames(self, text: str, exclude: Container[str] = ()) -> str:
+		"""Returns *text* with the first occurrence of every shipname turned into a wiki link,
+		using a single pass over the text.
+
+		:param text: the text to link shipnames in
+		:param exclude: shipnames that should not be linked"""
+		linked = set()
+		def link(match: re.Match) -> str:
+			name = match.group()
+			if name in linked or name in exclude:
+				return name
+			linked.add(name)
+			return f"[[{name}]]"
+		return self.name_pattern.sub(link, text)
+
 def load_converter(filepath: PathLike) -> ShipIDConverter:
 	"""Returns the converter using the cached converter data.
 
@@ -1,7 +1,7 @@
 import tomllib
 import shutil
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 SETTINGS_FILEPATH = Path("data", "settings.toml")
@@ -11,6 +11,11 @@ SETTINGS_FILEPATH_DEFAULT = Path("data", "static", "settings_default.toml")
 class APISettings:
     json_source_path: Path
     jsonloader_variant: str
+    sharecfg_cache: str = "none"
+    sharecfg_cache_path: Path = Path("data", "cache", "sharecfg")
+    cache_budget_mb: float = 0
+    cache_budget_datasets: int = 0
+    cache_pinned_modules: list[str] = field(default_factory=list)
 
 
 def read_settings(path: Path = SETTINGS_FILEPATH):
@@ -28,5 +33,10 @@ def read_and_parse_settings(path: Path | None = None) -> APISettings:
 
     return APISettings(
         json_source_path = Path(settings_data["source_json_path"]).resolve(),
-        jsonloader_variant = settings_data["jsonloader_variant"]
+        jsonloader_variant = settings_data["jsonloader_variant"],
+        sharecfg_cache = settings_data.get("sharecfg_cache", "none"),
+        sharecfg_cache_path = Path(settings_data.get("sharecfg_cache_path", "data/cache/sharecfg")),
+        cache_budget_mb = settings_data.get("cache_budget_mb", 0),
+        cache_budget_datasets = settings_data.get("cache_budget_datasets", 0),
+        cache_pinned_modules = settings_data.get("cache_pinned_modules", []),
     )
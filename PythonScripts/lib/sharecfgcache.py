@@ -0,0 +1,340 @@
+import re
+import json
+import mmap
+import struct
+from pathlib import Path
+from abc import abstractmethod
+from collections.abc import Iterable, Iterator, Mapping, MutableMapping
+from typing import Any
+
+from .api import Client, JsonLoader, CacheBudget
+
+
+class LazyJsonDict(MutableMapping):
+	"""
+	Dict of json data that only decodes the value of an entry when it is accessed.
+
+	The encoded entries are referenced by an index mapping each key to the buffer containing it
+	and the position of the encoded value inside of that buffer.
+	"""
+	_index: dict[str, tuple[bytes, int, int]]
+	_decoded: dict[str, Any]
+
+	def __init__(self, index: dict[str, tuple[bytes, int, int]]) -> None:
+		self._index = index
+		self._decoded = {}
+
+	def __getitem__(self, key: str) -> Any:
+		try:
+			return self._decoded[key]
+		except KeyError:
+			pass
+		buffer, offset, length = self._index[key]
+		value = self._decoded[key] = json.loads(buffer[offset:offset+length])
+		return value
+
+	def __setitem__(self, key: str, value: Any) -> None:
+		self._decoded[key] = value
+
+	def __delitem__(self, key: str) -> None:
+		if key not in self:
+			raise KeyError(key)
+		self._decoded.pop(key, None)
+		self._index.pop(key, None)
+
+	def __contains__(self, key: object) -> bool:
+		return key in self._decoded or key in self._index
+
+	def __iter__(self) -> Iterator[str]:
+		yield from self._index
+		for key in self._decoded:
+			if key not in self._index:
+				yield key
+
+	def __len__(self) -> int:
+		return len(self._index.keys() | self._decoded.keys())
+
+	def __ior__(self, other: Mapping) -> "LazyJsonDict":
+		# merging another lazy dict only merges the indices, so nothing has to be decoded
+		if isinstance(other, LazyJsonDict):
+			for key in other._index:
+				self._decoded.pop(key, None)
+			self._index |= other._index
+			self._decoded |= other._decoded
+		else:
+			self.update(other)
+		return self
+
+	def __repr__(self) -> str:
+		return f"<{self.__class__.__name__}: {len(self)} entries, {len(self._decoded)} decoded>"
+
+
+### BINARY CACHE FORMAT ###
+# header: magic, version, mtime and size of the json source file, size of the index
+# followed by the index as json and the data section with every entry encoded as compact json
+# the index is either a list of [key, offset, length] with offsets relative to the data section,
+# or null if the json source is not an object, in which case the data section contains the entire json
+CACHE_MAGIC = b"ALSC"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<4sBqqI")
+
+def encode_compact(value: Any) -> bytes:
+	return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf8")
+
+def write_binary_cache(cache_path: Path, jsondata: Any, source_mtime: int, source_size: int) -> None:
+	"""
+	Writes *jsondata* loaded from a sharecfg json file into a binary cache file at *cache_path*.
+	"""
+	if isinstance(jsondata, dict):
+		index = []
+		chunks = []
+		offset = 0
+		for key, value in jsondata.items():
+			chunk = encode_compact(value)
+			index.append([key, offset, len(chunk)])
+			chunks.append(chunk)
+			offset += len(chunk)
+		data = b"".join(chunks)
+	else:
+		index = None
+		data = encode_compact(jsondata)
+
+	index_data = encode_compact(index)
+	header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, source_mtime, source_size, len(index_data))
+
+	# write to a temporary file first, so a crash never leaves a broken cache file behind
+	cache_path.parent.mkdir(parents=True, exist_ok=True)
+	temp_path = cache_path.with_suffix(".tmp")
+	with open(temp_path, "wb") as f:
+		f.write(header)
+		f.write(index_data)
+		f.write(data)
+	temp_path.replace(cache_path)
+
+def read_binary_cache(cache_path: Path, source_mtime: int, source_size: int) -> LazyJsonDict | Any | None:
+	"""
+	Returns the data of the binary cache file at *cache_path*.
+	Returns None if the file does not exist or has been created from a different version of the json source.
+	"""
+	try:
+		with open(cache_path, "rb") as f:
+			buffer = f.read()
+	except FileNotFoundError:
+		return
+
+	if len(buffer) < CACHE_HEADER.size:
+		return
+	magic, version, mtime, size, index_length = CACHE_HEADER.unpack_from(buffer)
+	if magic != CACHE_MAGIC or version != CACHE_VERSION or mtime != source_mtime or size != source_size:
+		return
+
+	data_start = CACHE_HEADER.size + index_length
+	index = json.loads(buffer[CACHE_HEADER.size:data_start])
+	if index is None:
+		return json.loads(buffer[data_start:])
+	return LazyJsonDict({key: (buffer, data_start+offset, length) for key, offset, length in index})
+
+
+### MEMORY-MAPPED JSON INDEX ###
+# sidecar files use the same header as binary cache files, followed by the index as json
+INDEX_MAGIC = b"ALSI"
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+def build_json_index(buffer: bytes | mmap.mmap) -> list[list] | None:
+	"""
+	Scans the json in *buffer* and returns a list of [key, offset, length] for every key of the top-level object,
+	with offset and length in bytes. Returns None if the top-level value is not an object.
+	"""
+	text = buffer[:].decode("utf8")
+	skip_whitespace = lambda pos: _JSON_WHITESPACE.match(text, pos).end()
+
+	# character positions have to be converted to byte positions for non-ascii text
+	is_ascii = len(text) == len(buffer)
+	last_char, last_byte = 0, 0
+	def byte_position(char_position: int) -> int:
+		nonlocal last_char, last_byte
+		if is_ascii:
+			return char_position
+		last_byte += len(text[last_char:char_position].encode("utf8"))
+		last_char = char_position
+		return last_byte
+
+	pos = skip_whitespace(0)
+	if text[pos:pos+1] != "{":
+		return
+	pos = skip_whitespace(pos+1)
+	index = []
+	if text[pos:pos+1] == "}":
+		return index
+
+	while True:
+		# the values are decoded by the c scanner to find their end, which is much faster than scanning in python
+		key, pos = _JSON_DECODER.raw_decode(text, pos)
+		pos = skip_whitespace(pos)
+		if text[pos:pos+1] != ":":
+			raise ValueError(f"Expected ':' at position {pos}.")
+		start = skip_whitespace(pos+1)
+		_, pos = _JSON_DECODER.raw_decode(text, start)
+		start_byte = byte_position(start)
+		index.append([key, start_byte, byte_position(pos)-start_byte])
+
+		pos = skip_whitespace(pos)
+		separator = text[pos:pos+1]
+		if separator == "}":
+			return index
+		if separator != ",":
+			raise ValueError(f"Expected ',' or '}}' at position {pos}.")
+		pos = skip_whitespace(pos+1)
+
+def write_index_file(index_path: Path, index: list[list] | None, source_mtime: int, source_size: int) -> None:
+	index_data = encode_compact(index)
+	header = CACHE_HEADER.pack(INDEX_MAGIC, CACHE_VERSION, source_mtime, source_size, len(index_data))
+	index_path.parent.mkdir(parents=True, exist_ok=True)
+	temp_path = index_path.with_suffix(".tmp")
+	with open(temp_path, "wb") as f:
+		f.write(header)
+		f.write(index_data)
+	temp_path.replace(index_path)
+
+def read_index_file(index_path: Path, source_mtime: int, source_size: int) -> tuple[bool, list[list] | None]:
+	"""
+	Returns whether the index file at *index_path* is valid for the json source and the index it contains.
+	"""
+	try:
+		with open(index_path, "rb") as f:
+			buffer = f.read()
+	except FileNotFoundError:
+		return False, None
+
+	if len(buffer) < CACHE_HEADER.size:
+		return False, None
+	magic, version, mtime, size, index_length = CACHE_HEADER.unpack_from(buffer)
+	if magic != INDEX_MAGIC or version != CACHE_VERSION or mtime != source_mtime or size != source_size:
+		return False, None
+	return True, json.loads(buffer[CACHE_HEADER.size:CACHE_HEADER.size+index_length])
+
+
+class CacheWrapper_JsonLoader(JsonLoader):
+	"""
+	Base class for JsonLoaders that wrap another *loader* to load its sharecfg json files in a faster way,
+	using cache files inside *cache_directory* that are rebuilt whenever the json file changes.
+
+	All other files are loaded by the wrapped loader.
+	"""
+	cache_directory: Path
+	cache_suffix: str
+	_loader: JsonLoader
+
+	def __init__(self, loader: JsonLoader, cache_directory: Path) -> None:
+		super().__init__(loader.source_directory)
+		self._loader = loader
+		self.cache_directory = cache_directory
+
+	def __repr__(self) -> str:
+		return f"<{self.__class__.__name__}: {self._loader!r}, '{str(self.cache_directory)}'>"
+
+	def cache_path(self, sharecfg_name: str, client: Client) -> Path:
+		return Path(self.cache_directory, client.name, sharecfg_name+self.cache_suffix)
+
+	def sharecfg_directory(self, client: Client) -> Path:
+		return self._loader.sharecfg_directory(client)
+
+	def attach_cache_budget(self, budget: CacheBudget | None) -> None:
+		super().attach_cache_budget(budget)
+		self._loader.attach_cache_budget(budget)
+
+	@abstractmethod
+	def _build_cache(self, jsonpath: Path, cache_path: Path, force: bool = False) -> bool:
+		"""
+		Builds the cache file for the json file at *jsonpath* if it is missing or outdated,
+		or always if *force* is set. Returns whether the cache file has been built.
+		"""
+
+	def build_cache(self, clients: Iterable[Client]) -> int:
+		"""
+		Builds the cache files of all sharecfg files of *clients* that are outdated or missing.
+		Returns the amount of built cache files.
+		"""
+		built = 0
+		for client in clients:
+			sharecfg_directory = self.sharecfg_directory(client)
+			if not sharecfg_directory.exists():
+				continue
+			for jsonpath in sharecfg_directory.rglob("*.json"):
+				sharecfg_name = jsonpath.relative_to(sharecfg_directory).with_suffix("").as_posix()
+				if self._build_cache(jsonpath, self.cache_path(sharecfg_name, client)):
+					built += 1
+		return built
+
+	def load_sharecfgdata(self, sharecfg_name: str, client: Client) -> dict:
+		return self._loader.load_sharecfgdata(sharecfg_name, client)
+
+	def load_gamecfg(self, gamecfg_type: str, gamecfg_name: str, client: Client) -> dict:
+		return self._loader.load_gamecfg(gamecfg_type, gamecfg_name, client)
+
+class BinaryCache_JsonLoader(CacheWrapper_JsonLoader):
+	"""
+	JsonLoader that loads sharecfg files from precompiled binary cache files, which allow decoding
+	single entries instead of the entire file. The cache file for a module and client is built from
+	the sharecfg json file of the wrapped loader on first use and rebuilt when the json file changes.
+	"""
+	cache_suffix = ".bin"
+
+	def load_sharecfg(self, sharecfg_name: str, client: Client) -> LazyJsonDict | Any:
+		jsonpath = self._loader.sharecfg_path(sharecfg_name, client)
+		stat = jsonpath.stat()
+		cache_path = self.cache_path(sharecfg_name, client)
+
+		cached = read_binary_cache(cache_path, stat.st_mtime_ns, stat.st_size)
+		if cached is not None:
+			return cached
+
+		jsondata = self._loader.load_sharecfg(sharecfg_name, client)
+		write_binary_cache(cache_path, jsondata, stat.st_mtime_ns, stat.st_size)
+		return jsondata
+
+	def _build_cache(self, jsonpath: Path, cache_path: Path, force: bool = False) -> bool:
+		stat = jsonpath.stat()
+		if not force and read_binary_cache(cache_path, stat.st_mtime_ns, stat.st_size) is not None:
+			return False
+		with open(jsonpath, "r", encoding="utf8") as f:
+			jsondata = json.load(f)
+		write_binary_cache(cache_path, jsondata, stat.st_mtime_ns, stat.st_size)
+		return True
+
+class Mmap_JsonLoader(CacheWrapper_JsonLoader):
+	"""
+	JsonLoader that memory-maps sharecfg json files and only decodes the entries that are accessed.
+	The byte offsets of all top-level entries are stored in sidecar index files inside the cache directory,
+	which are built on first use and rebuilt when the json file changes.
+	"""
+	cache_suffix = ".idx"
+
+	def load_sharecfg(self, sharecfg_name: str, client: Client) -> LazyJsonDict | Any:
+		jsonpath = self._loader.sharecfg_path(sharecfg_name, client)
+		with open(jsonpath, "rb") as f:
+			stat = jsonpath.stat()
+			# empty files can not be mapped, let the wrapped loader handle them
+			if stat.st_size == 0:
+				return self._loader.load_sharecfg(sharecfg_name, client)
+			buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+		index_path = self.cache_path(sharecfg_name, client)
+		valid, index = read_index_file(index_path, stat.st_mtime_ns, stat.st_size)
+		if not valid:
+			index = build_json_index(buffer)
+			write_index_file(index_path, index, stat.st_mtime_ns, stat.st_size)
+
+		if index is None:
+			return json.loads(buffer[:])
+		return LazyJsonDict({key: (buffer, offset, length) for key, offset, length in index})
+
+	def _build_cache(self, jsonpath: Path, cache_path: Path, force: bool = False) -> bool:
+		stat = jsonpath.stat()
+		if stat.st_size == 0 or (not force and read_index_file(cache_path, stat.st_mtime_ns, stat.st_size)[0]):
+			return False
+		with open(jsonpath, "rb") as f:
+			index = build_json_index(f.read())
+		write_index_file(cache_path, index, stat.st_mtime_ns, stat.st_size)
+		return True
@@ -1,12 +1,14 @@
+import json
 import logging
-from dataclasses import dataclass
-from collections.abc import Iterable
+from pathlib import Path
+from dataclasses import dataclass, field
+from collections.abc import Iterable, Mapping
 
 from . import Client, SharecfgModule, Utility
 from .apiclasses import (ApiDataRef, LoginRewards, SharecfgDataRef, AwardDisplay, AwardDisplayLabeled, Award, BackyardTheme,
 	Chapter, Code, EquipStat, EquipStatUpgrade, Expedition, FurnitureData, Item, MetashipSkill,
 	MetataskRef, Metatask, Milestone, Resource, ShipID, ShipSkin, ShipStat, ShopItem, Task)
-from .Constants import Armor, Rarity, Nation, Attribute, ShipType
+from .Constants import Armor, Rarity, Nation, Attribute, ShipType, TASK_INDEX_CACHE_PATH
 
 
 @dataclass
@@ -152,7 +154,7 @@ class NameCode(SharecfgModule):
 		# start enumeration at one, since lua tables start keys at one
 		# the key also needs to be converted into a string to comply with SharecfgModule behaviour
 		#jsondata = {str(i): data for i, data in enumerate(jsondata, 1)}
-		if isinstance(jsondata, dict):
+		if isinstance(jsondata, Mapping):
 			jsondata = jsondata.values()
 		jsondata = {str(data['id']): data for data in jsondata}
 		super()._process_data(client, jsondata)
@@ -239,6 +241,77 @@ class ShipSkinTemplate(SharecfgModule):
 
 @dataclass
 class TaskDataTemplate(SharecfgModule):
+	# index of task ids by target id and sub_type, persisted inside TASK_INDEX_CACHE_PATH
+	_target_index: dict[Client, dict[str, list[str]]] = field(default_factory=dict, init=False, repr=False)
+
+	def _build_target_index(self, client: Client) -> dict[str, list[str]]:
+		"""
+		Builds the index from the raw json data without instantiating any Task.
+		Keys have the format "<target_id>:<sub_type>", matching tasks with that single target id
+		or with that target id inside their list of target ids.
+		"""
+		index = {}
+		for dataid in self.all_client_ids(client) or []:
+			data = self._load(str(dataid), client)
+			if not data:
+				continue
+			targetid_data = data.get("target_id")
+			if isinstance(targetid_data, str):
+				targetid_data = int(targetid_data) if targetid_data.isdigit() else None
+			targetids = targetid_data if isinstance(targetid_data, list) else [targetid_data]
+			for targetid in targetids:
+				if isinstance(targetid, int):
+					index.setdefault(f"{targetid}:{data.get('sub_type')}", []).append(str(dataid))
+		return index
+
+	def _load_target_index(self, client: Client) -> dict[str, list[str]]:
+		"""
+		Returns the target id index for *client*. The persisted index is only used
+		if the task json file has not changed since it has been built.
+		"""
+		if client in self._target_index:
+			return self._target_index[client]
+
+		try:
+			stat = self._loader.sharecfg_path(self.name, client).stat()
+			source = [stat.st_size, stat.st_mtime_ns]
+		except (NotImplementedError, OSError):
+			source = None
+
+		index_path = Path(TASK_INDEX_CACHE_PATH, client.name+".json")
+		index = None
+		if source and index_path.exists():
+			try:
+				with open(index_path, "r", encoding="utf8") as f:
+					cachedata = json.load(f)
+				if cachedata["source"] == source:
+					index = cachedata["index"]
+			except (OSError, ValueError, KeyError, TypeError):
+				# a broken index file is rebuilt like an outdated one
+				index = None
+
+		if index is None:
+			index = self._build_target_index(client)
+			if source:
+				# write to a temporary file first, so a crash never leaves a broken index file behind
+				index_path.parent.mkdir(parents=True, exist_ok=True)
+				temp_path = index_path.with_suffix(".tmp")
+				with open(temp_path, "w", encoding="utf8") as f:
+					json.dump({"source": source, "index": index}, f)
+				temp_path.replace(index_path)
+
+		self._target_index[client] = index
+		return index
+
+	def find_by_target(self, targetid: int, sub_type: int, client: Client) -> Task | None:
+		"""
+		Returns the first task of *sub_type* that has *targetid* as target for *client*.
+		If there is no such task, None is returned.
+		"""
+		for taskid in self._load_target_index(client).get(f"{targetid}:{sub_type}", []):
+			if task := self.load_client(taskid, client):
+				return task
+
 	def _instantiate_client(self, dataid: str, data: dict) -> Task:
 		award_display = data["award_display"]
 		# alert when a badly converted award_display property is found
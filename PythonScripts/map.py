@@ -1,7 +1,6 @@
 import re
 import math
 from collections import Counter
-from collections.abc import Iterable
 from argparse import ArgumentParser
 from itertools import chain
 
@@ -101,32 +100,13 @@ star_strings = {
 }
 
 
-def flatten(*args) -> Iterable:
-	iterables = []
-	for arg in args:
-		if isinstance(arg, Iterable):
-			iterables.extend(arg)
-		else:
-			iterables.append(arg)
-	return iterables
-
-
 def find_chapter_tasks(chapterid: int, api: ALJsonAPI, client: Client) -> tuple[Task, Task]:
 	"""
 	:return: Returns a tuple of format (<cleartask>, <threestartask>)
 	"""
-	clear_task = None
-	threestar_task = None
-
 	task_data_template = api.get_sharecfgmodule("task_data_template")
-	for task in task_data_template.all_client(client):
-		taskid_it = flatten(task.target_id)
-		if chapterid in taskid_it:
-			if task.sub_type == 1020: clear_task = task
-			elif task.sub_type == 1021: threestar_task = task
-			# break loop if both tasks are already found
-			if clear_task and threestar_task:
-				break
+	clear_task = task_data_template.find_by_target(chapterid, 1020, client)
+	threestar_task = task_data_template.find_by_target(chapterid, 1021, client)
 	return clear_task, threestar_task
 
 
@@ -147,24 +127,32 @@ def get_task_awards(task: Task, api: ALJsonAPI, client: Client, wikifier: WikiHe
 
 class EnemyNameLoader(CachedAPILoader):
 	def _generate_cache(self) -> None:
-		enemy_data_statistics = self._api.get_sharecfgmodule("enemy_data_statistics")
-		for entry in enemy_data_statistics.all_client(Client.EN):
-			if "icon" in entry:
-				priority = False
-				if entry_prev := self._cache.get(entry.icon):
-					entry_prev, priority = entry_prev
-				
-				if not priority:
-					if "name" in entry:
-						self._cache[entry.icon] = (entry, entry.name in self._api.ship_converter.ship_to_id)
-					else:
-						if entry_prev:
-							self._cache[entry.icon] = (entry_prev, False)
-						else:
-							self._cache[entry.icon] = (entry, False)
-	
+		# entries are only looked up for icons that are actually requested
+		self._enemy_data_statistics = self._api.get_sharecfgmodule("enemy_data_statistics")
+		self._icon_index = self._enemy_data_statistics.index_by("icon", Client.EN)
+
+	def get(self, icon: str) -> tuple | None:
+		"""Returns the enemy entry used for *icon* and whether it has the name of a ship, loading it on first access."""
+		if icon in self._cache:
+			return self._cache[icon]
+
+		result = None
+		for enemyid in self._icon_index.get(icon, []):
+			entry = self._enemy_data_statistics.load_client(enemyid, Client.EN)
+			if not entry:
+				continue
+			if "name" in entry:
+				result = (entry, entry.name in self._api.ship_converter.ship_to_id)
+				# an entry with the name of a ship is always preferred
+				if result[1]:
+					break
+			elif not result:
+				result = (entry, False)
+		self._cache[icon] = result
+		return result
+
 	def name_from_icon(self, icon: str) -> str:
-		if entry := self._cache.get(icon):
+		if entry := self.get(icon):
 			entry, priority = entry
 			name = entry.get("name") or entry.prefab
 			if priority:
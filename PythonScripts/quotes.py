@@ -1,6 +1,6 @@
 import re
 import enum
-import mwparserfromhell
+from pathlib import Path
 from dataclasses import dataclass
 from collections import Counter
 
@@ -98,6 +98,7 @@ ship_skin_words_extra = api.get_sharecfgmodule("ship_skin_words_extra")
 ship_skin_template = api.get_sharecfgmodule("ship_skin_template")
 ShipConverter = api.ship_converter
 wikiclient = WikiHelper.WikiClient().login()
+page_cache = WikiHelper.WikiPageCache(wikiclient)
 template_general = WikiHelper.MultilineTemplate('ShipQuote')
 template_en = WikiHelper.MultilineTemplate('ShipQuoteEN')
 
@@ -284,15 +285,14 @@ def getWikiQuoteData(shipname=None, quotepage=None) -> dict:
 	Either shipname or quotepage has to be given, otherwise None is returned.
 	"""
 	quote_wikidata = dict()
-	if not quotepage:
+	if quotepage:
+		quotepage = page_cache.store(quotepage)
+	else:
 		if not shipname: return None
-		quotepage = wikiclient.execute(wikiclient.mwclient.pages.get, shipname+'/Quotes')
+		quotepage = page_cache.get_page(shipname+'/Quotes')
 	if quotepage.exists:
-		mwparser = mwparserfromhell.parse(quotepage.text())
-		templates = mwparser.filter_templates()
-		for template in templates:
-			if not 'ShipQuote' in template.name: continue
-			parsed_template_data = WikiHelper.parse_multiline_template(str(template))
+		for template_name, parsed_template_data in page_cache.templates(quotepage.name):
+			if not 'ShipQuote' in template_name: continue
 			client = parsed_template_data.get('Region')
 			skinname = parsed_template_data.get('Skin').replace('Skin', '').replace('Base', '') or '0'
 			singleid = int(skinname.replace('PostPledge', '') or 0)
@@ -307,16 +307,14 @@ def getWikiQuoteData(shipname=None, quotepage=None) -> dict:
 				quote_wikidata[client][singleid][QuoteType.BASE] = parsed_template_data
 	return quote_wikidata
 
-def updateQuotePage(shipname, saveToFile=False) -> bool:
-	"""Updates the quote page of a given ship.
+def quotePageWikitext(shipname, quotepage=None) -> str:
+	"""Returns the wikitext of the quote page of a given ship.
 
-	:return:
-	 true if gallery page update was successful, otherwise false.
+	:param quotepage: if the quotepage is already loaded, it can be passed over
 	"""
 	# retrieve data from wiki and gamefiles
 	groupid = ShipConverter.convert(shipname)
 	quotes_gamedata = {client: getGameQuoteData(client, groupid) for client in DEFAULT_CLIENTS}
-	quotepage = wikiclient.execute(wikiclient.mwclient.pages.get, shipname+'/Quotes')
 	quotes_wikidata = dict()#getWikiQuoteData(quotepage=quotepage)
 
 	# merge game and wiki data
@@ -354,17 +352,40 @@ def updateQuotePage(shipname, saveToFile=False) -> bool:
 
 
 	wikitext = ["{{ShipTabber}}", "<tabber>"]+wikitext+["</tabber>"]
-	wikitext = "\n".join(wikitext)
+	return "\n".join(wikitext)
+
+def updateQuotePage(shipname, saveToFile=False) -> bool:
+	"""Updates the quote page of a given ship.
+
+	:return:
+	 true if gallery page update was successful, otherwise false.
+	"""
+	quotepage = page_cache.get_page(shipname+'/Quotes')
+	wikitext = quotePageWikitext(shipname, quotepage)
 
 	if saveToFile:
 		Utility.output('ship-quotes', wikitext)
 	else:
-		wikiclient.execute(quotepage.save, wikitext, summary='Added missing lines/updated changed information')
+		wikiclient.save_page(quotepage.name, wikitext, 'Added missing lines/updated changed information', quotepage.revision)
+	return True
+
+def updateQuotePages(shipnames, saveToFile=False) -> dict[str, bool]:
+	"""Updates the quote pages of all given ships, fetching and saving pages concurrently with generating them.
+
+	:return:
+	 a dict of the quote page titles and whether their update was successful.
+	"""
+	return wikiclient.update_pages(
+		[shipname+'/Quotes' for shipname in shipnames],
+		lambda quotepage: quotePageWikitext(quotepage.name.removesuffix('/Quotes'), quotepage),
+		summary='Added missing lines/updated changed information',
+		output_directory=Path("output", "quotes") if saveToFile else None,
+		page_cache=page_cache,
+	)
 
 def main():
 	#updateQuotePage("Hatakaze", True)
-	for ship in sorted(ShipConverter.ship_to_id.keys()):
-		updateQuotePage(ship)
+	updateQuotePages(sorted(ShipConverter.ship_to_id.keys()))
 
 
 if __name__ == "__main__":
@@ -1,4 +1,6 @@
-import math, re, mwparserfromhell
+import math, re, os, gc
+from pathlib import Path
+from functools import cache
 from argparse import ArgumentParser
 from collections.abc import Iterable
 
@@ -255,6 +257,10 @@ class OldIDLoader(CachedAPILoader):
 	def oldid_from_groupid(self, groupid: int | str) -> int:
 		return self._cache.get(groupid)
 
+@cache
+def get_oldid_loader(api: ALJsonAPI) -> OldIDLoader:
+	return OldIDLoader(api)
+
 
 def attributecode_from_id(param_id, api: ALJsonAPI, clients: Iterable[Client]):
 	attribute_info_by_type = api.get_sharecfgmodule("attribute_info_by_type")
@@ -329,7 +335,7 @@ def getGameData(ship_groupid, api: ALJsonAPI, clients: Iterable[Client]):
 		shipvals[3] = shipvals[0]
 
 	ship_data['GroupID'] = ship_groupid
-	ship_data['ID'] = OldIDLoader(api).oldid_from_groupid(ship_groupid)
+	ship_data['ID'] = get_oldid_loader(api).oldid_from_groupid(ship_groupid)
 	for client in [Client.CN, Client.JP]:
 		if ship0 := ship_data_statistics.load_client(f"{ship_groupid}1", client):
 			ship_data[client.name+'Name'] = api.replace_namecode(ship0.name, client)
@@ -915,37 +921,104 @@ def getGameData(ship_groupid, api: ALJsonAPI, clients: Iterable[Client]):
 	return ship_data
 
 
+@cache
+def wiki_page_cache() -> WikiHelper.WikiPageCache:
+	return WikiHelper.WikiPageCache(WikiHelper.WikiClient().login())
+
 def getWikiData(shipname):
-	wikiclient = WikiHelper.WikiClient().login()
-	wikipage = wikiclient.mwclient.pages[shipname]
 	parsed_template_data = dict()
-	if wikipage.exists:
-		mwparser = mwparserfromhell.parse(wikipage.text())
-		templates = mwparser.filter_templates()
-		for template in templates:
-			if not 'Ship' in template.name: continue
-			parsed_template_data = WikiHelper.parse_multiline_template(template)
+	for template_name, template_data in wiki_page_cache().templates(shipname):
+		if not 'Ship' in template_name: continue
+		parsed_template_data = template_data
 	return parsed_template_data
 
 
+def ship_groupid(name: str, api: ALJsonAPI) -> int:
+	groupid = api.ship_converter.get_groupid(name)
+	if not groupid:
+		try: groupid = int(name)
+		except: raise ValueError(f'Error: "{name}" is not a valid/unique ship name.')
+	return groupid
+
+def ship_wikitext(groupid: int, api: ALJsonAPI, clients: Iterable[Client]) -> str:
+	template_data_game = getGameData(groupid, api, clients)
+	ship_template = WikiHelper.MultilineTemplate("Ship")
+	return ship_template.fill(template_data_game)
+
+
+# modules used by getGameData, which are loaded once before generating multiple ships
+BATCH_MODULES = ["ship_data_group", "ship_data_statistics", "ship_data_template", "ship_skin_template",
+	"fleet_tech_ship_template", "fleet_tech_ship_class", "ship_data_blueprint", "ship_strengthen_blueprint",
+	"ship_data_trans", "transform_data_template", "ship_data_strengthen", "ship_strengthen_meta", "ship_meta_repair",
+	"ship_meta_repair_effect", "ship_data_breakout", "ship_meta_breakout", "skill_data_template", "skill_world_display",
+	"ship_data_by_star", "spweapon_data_statistics", "item_data_statistics", "item_virtual_data_statistics",
+	"ship_level", "attribute_info_by_type", "name_code"]
+
+def generate_ships(ships: list[tuple[str, int]], api: ALJsonAPI, clients: list[Client], output_directory: Path,
+		processes: int | None = None) -> None:
+	"""
+	Generates the Ship templates of all *ships* given as (name, groupid) and writes each one into *output_directory*
+	as soon as it has been generated.
+	"""
+	for modulename in BATCH_MODULES:
+		api.get_sharecfgmodule(modulename).preload(clients)
+	get_oldid_loader(api)
+	# converters are only loaded on first access
+	api.ship_converter
+	api.augment_converter
+	# move all loaded data out of the garbage collector's reach, so the forked processes
+	# don't copy the shared memory pages just by running a collection
+	gc.freeze()
+
+	names = {groupid: name for name, groupid in ships}
+	print(f"Generating {len(names)} ships...")
+	Utility.mkdir(output_directory)
+	failed = 0
+	for groupid, wikitext, error in Utility.parallel_generate(api, clients, ship_wikitext, names, processes):
+		name = names[groupid]
+		if error:
+			failed += 1
+			print(f"Failed to generate {name}: {error}")
+			continue
+		with open(Path(output_directory, Utility.wikitext_filename(name)), 'w', encoding='utf8') as f:
+			f.write(wikitext)
+	gc.unfreeze()
+	print(f"Generated {len(names)-failed} ships into {output_directory}, {failed} failed.")
+
 def main():
 	parser = ArgumentParser()
 	parser.add_argument("-c", "--clients", choices=Client.__members__, default = ['EN'], nargs = '+',
 						help="clients to gather information from (default: EN)")
-	parser.add_argument("-n", "--name", required=True, type=str,
-						help="name of the ship to get info from")
+	mode = parser.add_mutually_exclusive_group(required=True)
+	mode.add_argument("-n", "--name", type=str, nargs='+',
+						help="name of the ship to get info from, multiple ships are written into the output directory")
+	mode.add_argument("-f", "--file", type=Path,
+						help="file containing a ship name per line to write into the output directory")
+	mode.add_argument("-a", "--all", action="store_true",
+						help="write all ships known by the ship converter into the output directory")
+	parser.add_argument("-o", "--output", type=Path, default=Path("output", "ship"),
+						help="directory the templates of multiple ships are written into")
+	parser.add_argument("-p", "--processes", type=int, default=os.cpu_count(),
+						help="amount of processes used to generate multiple ships")
 	args = parser.parse_args()
 
 	clients = [ Client[c] for c in args.clients ]
 	api = ALJsonAPI()
-	groupid = api.ship_converter.get_groupid(args.name)
-	if not groupid:
-		try: groupid = int(args.name)
-		except: raise ValueError(f'Error: "{args.name}" is not a valid/unique ship name.')
-	template_data_game = getGameData(groupid, api, clients)
-	ship_template = WikiHelper.MultilineTemplate("Ship")
-	wikitext = ship_template.fill(template_data_game)
-	Utility.output(wikitext)
+	if args.name and len(args.name) == 1:
+		wikitext = ship_wikitext(ship_groupid(args.name[0], api), api, clients)
+		Utility.output(wikitext)
+		return
+
+	if args.all:
+		ships = [(name, groupid) for groupid, name in api.ship_converter.id_to_ship.items()]
+	else:
+		if args.file:
+			with open(args.file, 'r', encoding='utf8') as f:
+				names = [line.strip() for line in f if line.strip()]
+		else:
+			names = args.name
+		ships = [(name, ship_groupid(name, api)) for name in names]
+	generate_ships(ships, api, clients, args.output, args.processes)
 
 if __name__ == "__main__":
 	main()
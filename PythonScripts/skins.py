@@ -1,7 +1,6 @@
 from collections import Counter
 from itertools import chain
 from pathlib import Path
-from time import sleep
 from typing import Any, Callable
 
 import mwparserfromhell
@@ -16,6 +15,7 @@ shop_template = api.get_sharecfgmodule("shop_template")
 ship_converter = ships.load_converter(Constants.SHIPID_CONVERT_CACHE_PATH)
 
 wikiclient = WikiHelper.WikiClient().login()
+page_cache = WikiHelper.WikiPageCache(wikiclient)
 t_shipskin = WikiHelper.MultilineTemplate('ShipSkin')
 t_shipskin0 = WikiHelper.MultilineTemplate('ShipSkin0')
 
@@ -133,22 +133,25 @@ def wiki_skins(shipname: str, gallerypage = None) -> dict:
 	:param shipname: name of the ship
 	:param gallerypage: if the gallerypage is already loaded, it can be passed over
 	"""
-	if gallerypage is None: gallerypage = wikiclient.execute(wikiclient.mwclient.pages.get, shipname+'/Gallery')
+	if gallerypage is None: gallerypage = page_cache.get_page(shipname+'/Gallery')
+	else: gallerypage = page_cache.store(gallerypage)
 	if not gallerypage.exists: return
 
 	skins = dict()
-	mwparser = mwparserfromhell.parse(gallerypage.text())
-	templates = mwparser.filter_templates()
-	for template in templates:
-		if not 'ShipSkin' in template.name: continue
-		parsed_template = WikiHelper.parse_multiline_template(str(template))
+	for template_name, parsed_template in page_cache.templates(gallerypage.name):
+		if not 'ShipSkin' in template_name: continue
 		skinid_num = int(parsed_template.get('SkinID'))
 		skins[skinid_num] = parsed_template
 	
-	# search for additional art/artwork
+	# search for additional art/artwork, the full parse is only needed if the page has any
 	additional_art = '' 
+	wikitext = gallerypage.text()
+	lowered = wikitext.lower()
+	if not ('additional art' in lowered or 'artwork' in lowered):
+		return skins, additional_art
+
 	found_addart = False
-	for node in mwparser.nodes:
+	for node in mwparserfromhell.parse(wikitext).nodes:
 		nodename = str(node.lower())
 		if 'additional art' in nodename or 'artwork' in nodename:
 			found_addart = True
@@ -157,19 +160,17 @@ def wiki_skins(shipname: str, gallerypage = None) -> dict:
 	return skins, additional_art
 
 
-def update_gallery_page(shipname: str, save_to_file: bool = False, default_skincategory: str = '') -> bool:
-	"""Updates the gallery page of a given ship.
+def gallery_page_wikitext(shipname: str, gallerypage, default_skincategory: str = '') -> str:
+	"""Returns the wikitext of the gallery page of a given ship.
 
 	:param shipname: the name of a ship used on the wiki
-	:param save_to_file: outputs into a file in the /output directory instead of updating the wikipage
+	:param gallerypage: the current gallery page of the ship
 	:param default_skincategory: the default skincategory if new skins are found in the game files
-	:return: true if update was successful, otherwise false
 	"""
 	groupid = ship_converter.get_groupid(shipname)
 	if not groupid: raise ValueError(f'Shipname {shipname} does not lead to a valid groupid.')
 
 	# retrieve skins from wiki and game
-	gallerypage = wikiclient.execute(wikiclient.mwclient.pages.get, shipname+'/Gallery')
 	skins_game = game_skins(groupid)
 	skins_wiki, additionalArt = wiki_skins(shipname, gallerypage) or ({}, '')
 
@@ -198,18 +199,44 @@ def update_gallery_page(shipname: str, save_to_file: bool = False, default_skinc
 	
 	wikitext += '\n}}' # close tabber
 	if additionalArt: wikitext += f'\n\n{additionalArt}' # also add additional art at the end
+	return wikitext
+
+def gallery_summary(gallerypage) -> str:
+	return 'Added missing skins/updated changed information' if gallerypage.exists else 'Created gallery page'
+
+def update_gallery_page(shipname: str, save_to_file: bool = False, default_skincategory: str = '') -> bool:
+	"""Updates the gallery page of a given ship.
+
+	:param shipname: the name of a ship used on the wiki
+	:param save_to_file: outputs into a file in the /output directory instead of updating the wikipage
+	:param default_skincategory: the default skincategory if new skins are found in the game files
+	:return: true if update was successful, otherwise false
+	"""
+	gallerypage = page_cache.get_page(shipname+'/Gallery')
+	wikitext = gallery_page_wikitext(shipname, gallerypage, default_skincategory)
 
 	if save_to_file:
 		#save wikitext to file
 		Utility.output(wikitext, Path("output", "skins", shipname + ".wikitext"))
-		sleep(1)
 	else:
 		# update gallerypage on the wiki
-		summary = 'Added missing skins/updated changed information' if gallerypage.exists else 'Created gallery page'
-		gallerypage.save(wikitext, summary=summary)
-		sleep(2)
+		wikiclient.save_page(gallerypage.name, wikitext, gallery_summary(gallerypage), gallerypage.revision)
 	return True
 
+def update_gallery_pages(ships: dict[str, str], save_to_file: bool = False) -> dict[str, bool]:
+	"""Updates the gallery pages of multiple ships, fetching and saving pages concurrently with generating them.
+
+	:param ships: the names of ships used on the wiki with their default skincategory
+	:param save_to_file: outputs into files in the /output directory instead of updating the wikipages
+	:return: a dict of the gallery page titles and whether their update was successful
+	"""
+	def generate(gallerypage) -> str:
+		shipname = gallerypage.name.removesuffix('/Gallery')
+		return gallery_page_wikitext(shipname, gallerypage, ships[shipname])
+
+	return wikiclient.update_pages([shipname+'/Gallery' for shipname in ships], generate, summary=gallery_summary,
+		output_directory=Path("output", "skins") if save_to_file else None, page_cache=page_cache)
+
 
 def main():
 	update_gallery_page("Ayanami", save_to_file=True)
@@ -226,10 +253,9 @@ def main():
 		if not name in ships or cat:
 			ships[name] = cat
 
-	for shipname, defcat in ships.items():
-		print(f'Updating {shipname}...')
-		success = update_gallery_page(shipname, default_skincategory=defcat, save_to_file=True)
-		if not success: print('An error occured.')
+	results = update_gallery_pages(ships, save_to_file=True)
+	for title, success in results.items():
+		if not success: print(f'An error occured while updating {title}.')
 	"""
 
 if __name__ == "__main__":
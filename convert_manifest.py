@@ -0,0 +1,140 @@
+import json
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from typing import Any
+
+
+MANIFEST_DIRECTORY = Path("ConvertCache")
+
+
+def hash_bytes(data: bytes) -> str:
+	return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def hash_file(filepath: Path) -> str:
+	with open(filepath, "rb") as f:
+		return hash_bytes(f.read())
+
+
+@dataclass
+class ManifestEntry:
+	size: int
+	mtime: int
+	source_hash: str
+	target: str
+	output_hash: str | None = None
+	target_size: int | None = None
+	target_mtime: int | None = None
+	"""Size and modification time of the json file when it has last been checked against *output_hash*."""
+
+
+class ConvertManifest:
+	"""
+	Persistent record of converted lua files. Maps each source path to the hash of its content
+	and to the hash of the json file it has been converted to, so unchanged files can be skipped.
+	"""
+	path: Path
+	options: dict[str, Any]
+	entries: dict[str, ManifestEntry]
+	_pending: dict[str, ManifestEntry]
+	_seen: set[str]
+
+	def __init__(self, path: Path, options: dict[str, Any] | None = None) -> None:
+		"""
+		Loads the manifest from *path*. If the manifest has been created with different conversion *options*,
+		all its entries are discarded, since all outputs would change.
+		"""
+		self.path = path
+		self.options = options or {}
+		self.entries = {}
+		self._pending = {}
+		self._seen = set()
+		if path.exists():
+			with open(path, "r", encoding="utf8") as f:
+				data = json.load(f)
+			if data["options"] == self.options:
+				self.entries = {source: ManifestEntry(**entry) for source, entry in data["files"].items()}
+
+	@classmethod
+	def for_client(cls, client, options=None) -> "ConvertManifest":
+		return cls(Path(MANIFEST_DIRECTORY, client.name+".json"), asdict(options) if options else None)
+
+	def save(self) -> None:
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		with open(self.path, "w", encoding="utf8") as f:
+			data = {"options": self.options, "files": {source: asdict(entry) for source, entry in self.entries.items()}}
+			json.dump(data, f)
+
+	def delete(self) -> None:
+		self.entries.clear()
+		self.path.unlink(missing_ok=True)
+
+	def is_unchanged(self, source: Path, target: Path) -> bool:
+		"""
+		Returns whether *source* has already been converted to *target* and neither of them has changed since.
+		The contents are only hashed if size or modification time of the files differ from the manifest.
+		"""
+		key = source.as_posix()
+		self._seen.add(key)
+		stat = source.stat()
+
+		entry = self.entries.get(key)
+		if entry is None or entry.target != target.as_posix() or not self._is_target_unchanged(entry, target):
+			self._pending[key] = ManifestEntry(stat.st_size, stat.st_mtime_ns, hash_file(source), target.as_posix())
+			return False
+
+		if entry.size == stat.st_size and entry.mtime == stat.st_mtime_ns:
+			return True
+
+		# file has been touched, but content might still be the same
+		source_hash = hash_file(source)
+		if entry.source_hash == source_hash:
+			entry.size = stat.st_size
+			entry.mtime = stat.st_mtime_ns
+			return True
+
+		self._pending[key] = ManifestEntry(stat.st_size, stat.st_mtime_ns, source_hash, target.as_posix())
+		return False
+
+	def _is_target_unchanged(self, entry: ManifestEntry, target: Path) -> bool:
+		"""
+		Returns whether *target* still contains the json recorded in *entry*.
+		"""
+		if entry.output_hash is None:
+			return True
+		try:
+			stat = target.stat()
+		except FileNotFoundError:
+			return False
+		if entry.target_size == stat.st_size and entry.target_mtime == stat.st_mtime_ns:
+			return True
+
+		# json has been written since the last check or touched, but content might still be the same
+		if hash_file(target) != entry.output_hash:
+			return False
+		entry.target_size = stat.st_size
+		entry.target_mtime = stat.st_mtime_ns
+		return True
+
+	def record(self, source: Path, output_hash: str | None) -> None:
+		"""
+		Records the successful conversion of *source* that has been checked with is_unchanged before.
+		If the conversion did not produce any output, an existing json file from a previous conversion is removed.
+		"""
+		entry = self._pending.pop(source.as_posix())
+		entry.output_hash = output_hash
+		if output_hash is None:
+			Path(entry.target).unlink(missing_ok=True)
+		self.entries[source.as_posix()] = entry
+
+	def remove_stale(self) -> int:
+		"""
+		Removes all entries whose source has not been checked since loading the manifest,
+		together with their json files. Returns the amount of removed entries.
+		"""
+		stale = [key for key in self.entries if key not in self._seen]
+		for key in stale:
+			entry = self.entries.pop(key)
+			if entry.output_hash:
+				Path(entry.target).unlink(missing_ok=True)
+		return len(stale)
@@ -1,8 +1,27 @@
+import os
+import re
 import json
+import math
+import time
 import subprocess
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from argparse import ArgumentParser, Namespace
+from itertools import accumulate
+from collections.abc import Iterator, Generator
+from typing import Any, BinaryIO
+from subprocess import PIPE, DEVNULL
+from multiprocessing.util import Finalize
 from enum import Enum
 from pathlib import Path
 
+from convert_manifest import hash_bytes
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
 
 class Client(Enum):
 	locale_code: str
@@ -26,48 +45,695 @@ class Client(Enum):
 				return client
 
 
-def dump_json(target_path, content):
-	with open(target_path, "w", encoding="utf8") as f:
-		json.dump(content, f, indent=2, ensure_ascii=False)
+@dataclass(frozen=True)
+class ConvertOptions:
+	backend: str = "lua"
+	"""Either "lua" or "python", see load_lua. The backends write object keys in a different order."""
+	profile: str = "pretty"
+	"""Either "pretty" for indented json (as tracked in the json repository) or "compact", see encode_json."""
+
+	@staticmethod
+	def add_arguments(parser: ArgumentParser) -> None:
+		parser.add_argument("-b", "--backend", choices=["lua", "python"], default="lua",
+			help="'python' parses plain lua tables without lua and only falls back to lua for other files. "
+				"Its json keeps the key order of the lua source, while lua writes the keys in its hash order, "
+				"so the output differs from the 'lua' backend in key order")
+		parser.add_argument("-j", "--json-profile", choices=["pretty", "compact"], default="pretty",
+			help="'compact' writes json without indentation, which is faster and smaller")
 
+	@classmethod
+	def from_args(cls, args: Namespace) -> "ConvertOptions":
+		return cls(backend=args.backend, profile=args.json_profile)
 
-def convert_lua(filepath: Path, savedest: Path):
-	if "sharecfg" in filepath.parts:
-		# if file is also modified to contain function blocks, remove them
-		modified_file = False
-		with open(filepath, "r", encoding="utf8") as f:
-			content = f.read()
-		if "function ()" in content and "end()" in content:
-			content_replaced = content.replace("function ()", "").replace("end()", "")
-			with open(filepath, "w", encoding="utf8") as f:
-				f.write(content_replaced)
-			modified_file = True
-
-		# convert the file
+
+class StageTimer:
+	"""
+	Accumulates the time spent in the different stages of conversions, e.g. for benchmarking.
+	"""
+	stages: dict[str, float]
+
+	def __init__(self) -> None:
+		self.stages = {}
+
+	@contextmanager
+	def stage(self, name: str) -> Generator[None]:
+		start = time.perf_counter()
 		try:
-			result = subprocess.check_output(["lua", "serializer.lua",
-				str(filepath.with_suffix("")), filepath.stem], stderr=subprocess.DEVNULL)
-		except: return
+			yield
 		finally:
-			# revert the file, even if it fails to convert them
-			if modified_file:
-				with open(filepath, "w", encoding="utf8") as f:
-					f.write(content)
+			self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+def _stage(timer: StageTimer | None, name: str):
+	return timer.stage(name) if timer else nullcontext()
+
+
+class LuaWorkerError(Exception):
+	"""
+	Exception thrown when the lua worker process dies or answers with a malformed response.
+	"""
+
+class LuaConvertError(Exception):
+	"""
+	Exception thrown when lua fails to run or serialize a file.
+	"""
+
+class LuaWorker:
+	"""
+	A long-lived lua interpreter running "serializer_worker.lua".
+	Files are requested over stdin and the converted json is read back with a length prefix,
+	so the interpreter and cjson only have to be started once instead of once per file.
+	"""
+	def __init__(self) -> None:
+		try:
+			self.process = subprocess.Popen(["lua", "serializer_worker.lua"], stdin=PIPE, stdout=PIPE, stderr=DEVNULL)
+		except OSError as error:
+			raise LuaWorkerError("Could not start the lua worker process.") from error
+
+	def request(self, mode: str, chunkname: str, source: bytes, name: str = "") -> bytes:
+		"""
+		Returns the json encoded result of running the lua *source*, raises LuaConvertError if lua failed to convert it.
+		*mode* is either "sharecfg" (with *name* as the pg field to serialize) or "gamecfg".
+		*chunkname* is only used by lua for error messages.
+		"""
+		try:
+			self.process.stdin.write(f"{mode}\t{chunkname}\t{name}\t{len(source)}\n".encode("utf8"))
+			self.process.stdin.write(source)
+			self.process.stdin.flush()
+			header = self.process.stdout.readline().split()
+			if len(header) != 2:
+				raise LuaWorkerError(f"Malformed or missing response header: {header}")
+			status, length = header
+			payload = self.process.stdout.read(int(length))
+		except (OSError, ValueError) as error:
+			raise LuaWorkerError("Lua worker process is not responding.") from error
+
+		if status != b"ok":
+			raise LuaConvertError(payload.decode("utf8", "replace"))
+		return payload
+
+	def close(self) -> None:
+		self.process.stdin.close()
+		self.process.wait()
+
+
+# every process (e.g. every multiprocessing pool worker) uses its own lua worker
+_worker: LuaWorker | None = None
+
+def get_worker() -> LuaWorker:
+	global _worker
+	if _worker is None:
+		_worker = LuaWorker()
+		# unlike atexit handlers, multiprocessing finalizers also run when pool processes exit
+		Finalize(None, close_worker, exitpriority=0)
+	return _worker
+
+def close_worker() -> None:
+	global _worker
+	if _worker is not None:
+		_worker.close()
+		_worker = None
 
-	# convert non-sharecfg files with other lua serializer script
+def run_lua(mode: str, chunkname: str, source: bytes, name: str = "") -> bytes:
+	"""
+	Converts lua source code using the lua worker of the current process.
+	If the worker died during the request, it is replaced for the next request and the LuaWorkerError is raised again.
+	"""
+	global _worker
+	try:
+		return get_worker().request(mode, chunkname, source, name)
+	except LuaWorkerError:
+		if _worker is not None:
+			_worker.process.kill()
+			_worker = None
+		raise
+
+
+class LuaParseError(ValueError):
+	"""
+	Exception thrown when lua source contains code that can not be handled by the python table parser.
+	"""
+
+_LUA_TOKEN = re.compile(rb"""
+	\s*(?:
+	(?P<comment>--(?:\[(?P<commentlevel>=*)\[.*?\](?P=commentlevel)\]|[^\n]*))
+	|(?P<longstring>\[(?P<stringlevel>=*)\[.*?\](?P=stringlevel)\])
+	|(?P<string>"(?:[^"\\\r\n]|\\(?:\r\n|.|\n))*"|'(?:[^'\\\r\n]|\\(?:\r\n|.|\n))*')
+	|(?P<hex>0[xX][0-9a-fA-F]+)
+	|(?P<float>\d+\.\d*(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+|\.\d+(?:[eE][+-]?\d+)?)
+	|(?P<int>\d+)
+	|(?P<name>[A-Za-z_]\w*)
+	|(?P<op>\.\.\.|\.\.|==|~=|<=|>=|[-+*/%^#<>=(){}\[\];:,.])
+	|(?P<error>.)
+	|\Z
+	)
+""", re.VERBOSE | re.DOTALL)
+_LUA_ESCAPE = re.compile(rb"\\(\d{1,3}|\r\n|\n\r|.)", re.DOTALL)
+_LUA_ESCAPE_CHARS = {b"a": b"\a", b"b": b"\b", b"f": b"\f", b"n": b"\n", b"r": b"\r", b"t": b"\t", b"v": b"\v",
+	b"\r": b"\n", b"\r\n": b"\n", b"\n\r": b"\n"}
+_LUA_KEYWORDS = {"and", "break", "do", "else", "elseif", "end", "false", "for", "function", "if", "in",
+	"local", "nil", "not", "or", "repeat", "return", "then", "true", "until", "while"}
+
+def _lua_unescape(match: re.Match) -> bytes:
+	escape = match.group(1)
+	if escape.isdigit():
+		if int(escape) > 255:
+			raise LuaParseError(f"Escape sequence too large: \\{escape.decode()}")
+		return bytes((int(escape),))
+	return _LUA_ESCAPE_CHARS.get(escape, escape)
+
+def _decode_lua_string(value: bytes) -> str:
+	try:
+		return value.decode("utf8")
+	except UnicodeDecodeError as error:
+		raise LuaParseError("String is not valid utf8.") from error
+
+def _tokenize_lua(source: bytes) -> Iterator[tuple[str, Any]]:
+	"""
+	Yields the tokens of *source* as (kind, value) tuples, ending with an ("eof", None) token.
+	Operators and keywords use themselves as kind.
+	"""
+	for m in _LUA_TOKEN.finditer(source):
+		kind = m.lastgroup
+		if kind == "name":
+			name = m.group(kind).decode("ascii")
+			if name in _LUA_KEYWORDS:
+				yield name, None
+			else:
+				yield kind, name
+		elif kind == "op":
+			yield m.group(kind).decode("ascii"), None
+		elif kind == "int":
+			yield "number", int(m.group(kind))
+		elif kind == "string":
+			value = m.group(kind)[1:-1]
+			if b"\\" in value:
+				value = _LUA_ESCAPE.sub(_lua_unescape, value)
+			yield "string", _decode_lua_string(value)
+		elif kind == "float":
+			yield "number", float(m.group(kind))
+		elif kind == "hex":
+			yield "number", int(m.group(kind), 16)
+		elif kind == "longstring":
+			level = len(m.group("stringlevel"))
+			value = m.group(kind)[level+2:-level-2]
+			# lua skips the first newline of long strings and normalizes all newlines
+			value = value.replace(b"\r\n", b"\n").replace(b"\n\r", b"\n").replace(b"\r", b"\n")
+			if value.startswith(b"\n"):
+				value = value[1:]
+			yield "string", _decode_lua_string(value)
+		elif kind == "error":
+			raise LuaParseError(f"Unexpected {m.group(kind)} at position {m.start(kind)}.")
+	yield "eof", None
+
+
+def _lua_vector3(*args) -> dict:
+	return {i: arg for i, arg in enumerate(args[:3], 1) if arg is not None}
+
+def _lua_key(key: Any) -> Any:
+	if key is None:
+		raise LuaParseError("Table index is nil.")
+	if isinstance(key, float) and key.is_integer():
+		return int(key)
+	return key
+
+def _lua_set(table: dict, key: Any, value: Any) -> None:
+	key = _lua_key(key)
+	if value is None:
+		table.pop(key, None)
 	else:
+		table[key] = value
+
+_LUA_CONSTANTS = {"nil": None, "true": True, "false": False}
+
+class _LuaTableParser:
+	"""
+	Parser for lua chunks that only consist of (local) assignments, table constructors and a final return statement.
+	Assignments are run on *env*, which is used as table for global variables.
+	"""
+	def __init__(self, source: bytes, env: dict) -> None:
+		self.tokens = _tokenize_lua(source)
+		self.kind, self.value = next(self.tokens)
+		self.following = None
+		self.env = env
+
+	def advance(self) -> Any:
+		"""
+		Moves to the next token and returns the value of the current one.
+		"""
+		value = self.value
+		if self.following:
+			self.kind, self.value = self.following
+			self.following = None
+		else:
+			self.kind, self.value = next(self.tokens)
+		return value
+
+	def peek_following(self) -> str:
+		"""
+		Returns the kind of the token after the current one.
+		"""
+		if not self.following:
+			self.following = next(self.tokens)
+		return self.following[0]
+
+	def expect(self, kind: str) -> Any:
+		if self.kind != kind:
+			raise LuaParseError(f"Expected {kind}, got {self.kind} {self.value!r}.")
+		return self.advance()
+
+	def run(self) -> Any:
+		"""
+		Runs all statements of the chunk and returns the value of the return statement.
+		"""
+		while self.kind != "eof":
+			if self.kind == "name":
+				self.assignment()
+			elif self.kind == ";":
+				self.advance()
+			elif self.kind == "local":
+				self.advance()
+				name = self.expect("name")
+				value = None
+				if self.kind == "=":
+					self.advance()
+					value = self.expression()
+				_lua_set(self.env, name, value)
+			elif self.kind == "return":
+				self.advance()
+				result = None
+				if self.kind not in ("eof", ";"):
+					result = self.expression()
+				if self.kind == ";":
+					self.advance()
+				if self.kind != "eof":
+					raise LuaParseError(f"Unexpected {self.kind} {self.value!r} after return statement.")
+				return result
+			else:
+				raise LuaParseError(f"Unsupported statement starting with {self.kind} {self.value!r}.")
+
+	def assignment(self) -> None:
+		table, key = self.env, self.expect("name")
+		while self.kind != "=":
+			if self.kind == ".":
+				self.advance()
+				nextkey = self.expect("name")
+			elif self.kind == "[":
+				self.advance()
+				nextkey = self.expression()
+				self.expect("]")
+			else:
+				raise LuaParseError(f"Unsupported statement containing {self.kind} {self.value!r}.")
+
+			table = table.get(_lua_key(key))
+			if not isinstance(table, dict):
+				raise LuaParseError("Attempt to index a non-table value.")
+			key = nextkey
+		self.advance()
+		_lua_set(table, key, self.expression())
+
+	def expression(self) -> Any:
+		value = self.simple_expression()
+		while self.kind in ("or", "and"):
+			operator = self.kind
+			self.advance()
+			right = self.simple_expression()
+			# "and" binds stronger than "or"
+			while operator == "or" and self.kind == "and":
+				self.advance()
+				if not (right is None or right is False):
+					right = self.simple_expression()
+				else:
+					self.simple_expression()
+
+			if operator == "or":
+				if value is None or value is False:
+					value = right
+			elif not (value is None or value is False):
+				value = right
+		return value
+
+	def simple_expression(self) -> Any:
+		kind = self.kind
+		if kind == "number" or kind == "string":
+			return self.advance()
+		if kind == "{":
+			self.advance()
+			return self.table()
+		if kind == "name":
+			return self.suffixed_expression(self.env.get(self.advance()))
+		if kind in _LUA_CONSTANTS:
+			self.advance()
+			return _LUA_CONSTANTS[kind]
+		if kind == "-":
+			self.advance()
+			operand = self.simple_expression()
+			if isinstance(operand, bool) or not isinstance(operand, (int, float)):
+				raise LuaParseError("Attempt to perform arithmetic on a non-number value.")
+			return -operand
+		if kind == "(":
+			self.advance()
+			result = self.expression()
+			self.expect(")")
+			return result
+		raise LuaParseError(f"Unsupported expression starting with {kind} {self.value!r}.")
+
+	def suffixed_expression(self, value: Any) -> Any:
+		while True:
+			if self.kind == ".":
+				self.advance()
+				key = self.expect("name")
+			elif self.kind == "[":
+				self.advance()
+				key = self.expression()
+				self.expect("]")
+			elif self.kind == "(":
+				# the only functions available are builtins like Vector3
+				if not callable(value):
+					raise LuaParseError("Unsupported function call.")
+				self.advance()
+				args = []
+				while self.kind != ")":
+					if args:
+						self.expect(",")
+					args.append(self.expression())
+				self.advance()
+				value = value(*args)
+				continue
+			else:
+				return value
+
+			if not isinstance(value, dict):
+				raise LuaParseError("Attempt to index a non-table value.")
+			value = value.get(_lua_key(key))
+
+	def table(self) -> dict:
+		"""
+		Parses a table constructor, the opening bracket has to be consumed already.
+		"""
+		table = {}
+		index = 1
+		while self.kind != "}":
+			if self.kind == "[":
+				self.advance()
+				key = self.expression()
+				self.expect("]")
+				self.expect("=")
+				_lua_set(table, key, self.expression())
+			elif self.kind == "name" and self.peek_following() == "=":
+				key = self.advance()
+				self.advance()
+				_lua_set(table, key, self.expression())
+			else:
+				value = self.expression()
+				if value is not None:
+					table[index] = value
+				index += 1
+
+			if self.kind == "," or self.kind == ";":
+				self.advance()
+			elif self.kind != "}":
+				raise LuaParseError(f"Unexpected {self.kind} {self.value!r} in table constructor.")
+		self.advance()
+		return table
+
+
+def _cjson_number(number: int | float) -> int | float:
+	# cjson encodes all numbers with a precision of 14 digits
+	if isinstance(number, int) and -10**14 < number < 10**14:
+		return number
+	if not math.isfinite(number):
+		raise LuaParseError("Can not encode inf or nan numbers.")
+	text = "%.14g" % number
+	if "." in text or "e" in text:
+		return float(text)
+	return int(text)
+
+def _cjson_data(value: Any) -> Any:
+	"""
+	Converts parsed lua values to json compatible data the same way cjson encodes them,
+	including the conversion of excessively sparse arrays into objects.
+	"""
+	if isinstance(value, dict):
+		max_index = 0
+		for key in value:
+			if isinstance(key, int) and not isinstance(key, bool) and key >= 1:
+				max_index = max(max_index, key)
+			else:
+				max_index = -1
+				break
+		if max_index > 0 and not (max_index > len(value)*2 and max_index > 10):
+			return [_cjson_data(value.get(i)) for i in range(1, max_index+1)]
+
+		data = {}
+		for key, item in value.items():
+			if isinstance(key, bool) or not isinstance(key, (int, float, str)):
+				raise LuaParseError("Table key must be a number or string.")
+			if not isinstance(key, str):
+				key = "%.14g" % key
+			data[key] = _cjson_data(item)
+		return data
+	if isinstance(value, bool) or value is None or isinstance(value, str):
+		return value
+	if isinstance(value, (int, float)):
+		return _cjson_number(value)
+	raise LuaParseError(f"Can not encode value of type {type(value).__name__}.")
+
+def parse_lua(mode: str, source: bytes, name: str = "") -> Any:
+	"""
+	Returns the same data as converting *source* with the lua worker, but without running lua.
+	Only works for chunks that consist of plain table assignments, otherwise LuaParseError is raised.
+	"""
+	env = {"Vector3": _lua_vector3}
+	if mode == "sharecfg":
+		env["uv0"] = env["pg"] = {}
+		_LuaTableParser(source, env).run()
+		if not isinstance(pg := env.get("pg"), dict):
+			raise LuaParseError("Global pg is not a table.")
+		result = pg.get(name)
+	else:
+		result = _LuaTableParser(source, env).run()
+	return _cjson_data(result)
+
+
+def encode_json(content, profile: str = "pretty") -> bytes:
+	"""
+	Encodes *content* as utf8 json. The "pretty" *profile* always uses the json module with indentation,
+	so the output stays stable. The "compact" profile uses orjson if it is installed.
+	"""
+	if profile == "compact":
+		if orjson:
+			return orjson.dumps(content)
+		return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf8")
+	return json.dumps(content, indent=2, ensure_ascii=False).encode("utf8")
+
+def write_json(target_path: Path, data: bytes, timer: StageTimer | None = None) -> str:
+	"""
+	Writes the encoded json *data* to *target_path*, creating missing directories, and returns the hash of the written file.
+	"""
+	with _stage(timer, "write"):
+		target_path.parent.mkdir(parents=True, exist_ok=True)
+		with open(target_path, "wb") as f:
+			f.write(data)
+	return hash_bytes(data)
+
+
+class JsonWriter:
+	"""
+	Writer stage of conversion pipelines, so pool workers only have to convert and hand over the encoded json.
+	Files are written to a temporary file next to their destination and only renamed over it after being synced
+	to disk, so a crashed run never leaves half-written json files behind. Syncing is done in batches of
+	*batch_size* files and directories that already exist are remembered instead of being created again.
+	"""
+	batch_size: int
+	fsync: bool
+	_directories: set[Path]
+	_pending: list[tuple[BinaryIO, Path, Path]]
+
+	def __init__(self, batch_size: int = 256, fsync: bool = True) -> None:
+		self.batch_size = batch_size
+		self.fsync = fsync
+		self._directories = set()
+		self._pending = []
+
+	def __enter__(self) -> "JsonWriter":
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback) -> None:
+		# files of an interrupted run are discarded, so no temporary files are left behind
+		if exc_type is None:
+			self.flush()
+		else:
+			self.discard()
+
+	def write(self, target_path: Path, data: bytes) -> str:
+		"""
+		Writes the encoded json *data* to *target_path* and returns the hash of the file.
+		The file only appears at *target_path* once its batch is flushed.
+		"""
+		directory = target_path.parent
+		if directory not in self._directories:
+			directory.mkdir(parents=True, exist_ok=True)
+			self._directories.update((directory, *directory.parents))
+
+		temp_path = target_path.with_name(target_path.name+".tmp")
+		# the file stays open until it is synced, since fsync needs a writable handle on windows
+		f = open(temp_path, "wb")
+		self._pending.append((f, temp_path, target_path))
+		f.write(data)
+		if len(self._pending) >= self.batch_size:
+			self.flush()
+		return hash_bytes(data)
+
+	def flush(self) -> None:
+		"""
+		Syncs all written files to disk and renames them to their destinations.
+		If this fails, the files that have not been renamed yet are discarded.
+		"""
+		renamed = 0
 		try:
-			result = subprocess.check_output(["lua", "serializer2.lua",
-				str(filepath.with_suffix(""))], stderr=subprocess.DEVNULL)
-		except: return
+			# syncing after the whole batch has been written lets the filesystem write the files back together
+			for f, _, _ in self._pending:
+				if self.fsync:
+					f.flush()
+					os.fsync(f.fileno())
+				f.close()
+			for _, temp_path, target_path in self._pending:
+				os.replace(temp_path, target_path)
+				renamed += 1
+		finally:
+			del self._pending[:renamed]
+			self.discard()
+
+	def discard(self) -> None:
+		"""
+		Closes and removes all temporary files that have not been renamed to their destinations.
+		"""
+		for f, temp_path, _ in self._pending:
+			f.close()
+			temp_path.unlink(missing_ok=True)
+		self._pending.clear()
+
+
+_JSON_STRING = re.compile(rb'("[^"\\]*(?:\\.[^"\\]*)*")')
+_JSON_BRACKET = re.compile(rb"([{\[][}\]]?|[}\]])")
+_JSON_EXPONENT = re.compile(rb"-?\d+(?:\.\d+)?[eE][-+]?\d+|-0(?![.\d])")
+_JSON_BRACKET_DEPTH = {b"{": 1, b"[": 1, b"}": -1, b"]": -1, b"{}": 0, b"[]": 0}
+_EMPTY_JSON = {b"null", b"{}", b"[]", b"false", b"0", b'""'}
+
+def is_empty_json(data: bytes) -> bool:
+	"""
+	Returns whether the encoded json *data* is null or an empty (falsy) value, without decoding it.
+	"""
+	return len(data) < 8 and data.strip() in _EMPTY_JSON
+
+def _reencode_json(match: re.Match) -> bytes:
+	return json.dumps(json.loads(match.group()), ensure_ascii=False).encode("utf8")
+
+def reformat_json(data: bytes, profile: str = "pretty") -> bytes:
+	"""
+	Reformats the compact json *data* of cjson to the same output encode_json gives with the json module
+	for its decoded content, but without building the decoded objects.
+
+	Strings are cut out first, so the remaining skeleton of brackets, separators and scalars can be
+	indented with bytes operations between every pair of brackets. Only strings with escape sequences
+	and numbers in exponent notation are reencoded, since cjson escapes and formats them differently.
+	"""
+	parts = _JSON_STRING.split(data)
+	strings = parts[1::2]
+	if b"\\" in data:
+		strings = [_reencode_json(_JSON_STRING.match(string)) if b"\\" in string else string for string in strings]
+	# strings are marked with a null byte, which cjson always escapes inside strings
+	skeleton = b"\0".join(parts[0::2]).translate(None, b" \t\r\n")
+	if b"e+" in skeleton or b"e-" in skeleton or b"E" in skeleton or b"-0" in skeleton:
+		skeleton = _JSON_EXPONENT.sub(_reencode_json, skeleton)
+
+	if profile == "pretty":
+		segments = _JSON_BRACKET.split(skeleton.replace(b":", b": "))
+		brackets = segments[1::2]
+		depths = list(accumulate(map(_JSON_BRACKET_DEPTH.__getitem__, brackets)))
+		newlines = [b"\n" + b"  "*depth for depth in range(max(depths, default=0)+1)]
+		commas = [b"," + newline for newline in newlines]
+		# the depth after each bracket applies to the bracket and the segment following it
+		segments[1::2] = [bracket + newlines[depth] if bracket in (b"{", b"[") else
+			newlines[depth] + bracket if bracket in (b"}", b"]") else bracket
+			for bracket, depth in zip(brackets, depths)]
+		segments[2::2] = [segment.replace(b",", commas[depth]) for segment, depth in zip(segments[2::2], depths)]
+		skeleton = b"".join(segments)
+
+	skeleton_parts = skeleton.split(b"\0")
+	result = [b""] * (len(skeleton_parts) + len(strings))
+	result[0::2] = skeleton_parts
+	result[1::2] = strings
+	return b"".join(result)
 
-	json_string = result.decode("utf8")
-	if json_string.startswith("null"):
-		return
 
-	# parse json, if its empty (or an empty structure), skip
-	if not (json_data := json.loads(json_string)):
+def strip_function_blocks(source: bytes) -> bytes:
+	"""
+	Removes the function blocks some sharecfg files are wrapped in, so the assignments inside are run directly.
+	"""
+	if b"function ()" in source and b"end()" in source:
+		return source.replace(b"function ()", b"").replace(b"end()", b"")
+	return source
+
+
+def load_lua(mode: str, chunkname: str, source: bytes, name: str = "", backend: str = "lua", profile: str = "pretty",
+		timer: StageTimer | None = None) -> bytes | None:
+	"""
+	Returns the data of the lua *source* as json encoded with *profile*, or None if it is empty.
+	With the "python" *backend*, lua is only used for files that can not be parsed by the python table parser.
+	The python parser keeps the key order of the source, while lua encodes keys in its hash order.
+	The json returned by lua is only reformatted and never decoded.
+	Raises LuaConvertError or LuaWorkerError if lua fails, which is never treated as empty output.
+	"""
+	if backend == "python":
+		try:
+			with _stage(timer, "parse"):
+				json_data = parse_lua(mode, source, name)
+		except LuaParseError:
+			pass
+		else:
+			if not json_data:
+				return
+			with _stage(timer, "encode"):
+				return encode_json(json_data, profile)
+
+	with _stage(timer, "lua"):
+		result = run_lua(mode, chunkname, source, name)
+	if is_empty_json(result):
 		return
 
-	savedest.parent.mkdir(parents=True, exist_ok=True)
-	dump_json(savedest, json_data)
\ No newline at end of file
+	with _stage(timer, "encode"):
+		return reformat_json(result, profile)
+
+
+def convert_lua_source(source: bytes, filepath: Path, options: ConvertOptions = ConvertOptions(),
+		timer: StageTimer | None = None) -> bytes | None:
+	"""
+	Converts the lua *source* of the file at *filepath* to encoded json. The file itself is not read,
+	its path only decides how the source is run, so the source can also come from elsewhere (e.g. a git blob).
+	Returns None if the result is empty.
+	"""
+	# sharecfg files assign their table to the pg field with the same name as the file
+	# if the file is also modified to contain function blocks, they are removed before running it
+	# if the result is empty (or an empty structure), None is returned
+	if "sharecfg" in filepath.parts:
+		return load_lua("sharecfg", str(filepath), strip_function_blocks(source), filepath.stem,
+			options.backend, options.profile, timer)
+	# convert non-sharecfg files as gamecfg files that return their table
+	return load_lua("gamecfg", str(filepath), source, backend=options.backend, profile=options.profile, timer=timer)
+
+def convert_lua(filepath: Path, savedest: Path, options: ConvertOptions = ConvertOptions(),
+		timer: StageTimer | None = None) -> str | None:
+	"""
+	Converts the lua file at *filepath* to json and saves it at *savedest*.
+	If a *timer* is given, the time spent in each stage of the conversion is added to it.
+	Returns the hash of the saved json file, or None if nothing has been saved.
+	"""
+	with _stage(timer, "read"):
+		with open(filepath, "rb") as f:
+			source = f.read()
+
+	data = convert_lua_source(source, filepath, options, timer)
+	if data is None:
+		return
+	return write_json(savedest, data, timer)
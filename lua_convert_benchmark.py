@@ -0,0 +1,196 @@
+import json
+import time
+import random
+import cProfile
+import pstats
+import platform
+import subprocess
+import tempfile
+import statistics
+from pathlib import Path
+import multiprocessing as mp
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+
+from lua_convert import ConvertOptions, StageTimer, convert_lua
+from lua_converter import directory_destinations
+
+
+def lua_value(rng: random.Random, depth: int = 0) -> str:
+	kind = rng.randrange(6 if depth < 2 else 4)
+	if kind == 0: return str(rng.randrange(100000))
+	if kind == 1: return str(round(rng.uniform(0, 100), 3))
+	if kind == 2: return '"' + "".join(rng.choices("abcdefghijklmnopqrstuvwxyz ", k=rng.randrange(30))) + '"'
+	if kind == 3: return rng.choice(["true", "false"])
+	if kind == 4: return "{" + ", ".join(lua_value(rng, depth+1) for _ in range(rng.randrange(8))) + "}"
+	return "{" + ", ".join(f"key{i} = {lua_value(rng, depth+1)}" for i in range(rng.randrange(6))) + "}"
+
+def lua_entry(rng: random.Random, entryid: int) -> str:
+	fields = [f"id = {entryid}"] + [f"field{i} = {lua_value(rng)}" for i in range(rng.randrange(4, 16))]
+	return f"\t[{entryid}] = {{\n\t\t" + ",\n\t\t".join(fields) + "\n\t}"
+
+def generate_corpus(directory: Path, file_count: int, entries: int, seed: int = 0) -> list[Path]:
+	"""
+	Generates *file_count* lua files inside *directory* that look like sharecfg and gamecfg files.
+	File sizes are skewed, so there are few large and many small files like in the real source tree.
+	"""
+	rng = random.Random(seed)
+	files = []
+	for i in range(file_count):
+		entry_count = max(1, int(rng.paretovariate(1.5) * entries / 3))
+		body = ",\n".join(lua_entry(rng, entryid) for entryid in range(1, entry_count+1))
+
+		# two thirds are sharecfg files, some of them using function blocks
+		if i % 3:
+			name = f"synthetic_{i}"
+			filepath = Path(directory, "sharecfg", name+".lua")
+			if i % 5 == 0:
+				content = f"pg = pg or {{}}\npg.{name} = {{}}\nfunction ()\n\tpg.{name} = {{\n{body}\n}}\nend()\n"
+			else:
+				content = f"pg = pg or {{}}\npg.{name} = {{\n{body}\n}}\n"
+		else:
+			filepath = Path(directory, "gamecfg", "skill", f"skill_{i}.lua")
+			content = f"return {{\n{body}\n}}\n"
+
+		filepath.parent.mkdir(parents=True, exist_ok=True)
+		filepath.write_text(content, encoding="utf8")
+		files.append(filepath)
+	return files
+
+
+def source_files(source_root: Path) -> list[Path]:
+	"""
+	Returns the lua files of a client source directory that the converter converts,
+	other lua files like the game scripts are often no plain data and fail to convert.
+	"""
+	files = []
+	for directory, _ in directory_destinations:
+		# jp has a different folder for story files
+		for convert_from in {directory, directory.with_name(directory.name+"jp") if directory.name == "story" else directory}:
+			files.extend(Path(source_root, convert_from).rglob("*.lua"))
+	return sorted(files)
+
+
+def timed_convert(filepath: Path, savedest: Path, options: ConvertOptions) -> tuple[float, dict[str, float], str]:
+	"""
+	Converts a single file and returns the duration, the stage times and whether the result was "converted", "empty" or "failed".
+	"""
+	timer = StageTimer()
+	start = time.perf_counter()
+	try:
+		status = "empty" if convert_lua(filepath, savedest, options, timer) is None else "converted"
+	except Exception as error:
+		print(f"Failed to convert {filepath}: {error}")
+		status = "failed"
+	return time.perf_counter() - start, timer.stages, status
+
+def run_benchmark(files: list[Path], source_root: Path, output_root: Path, options: ConvertOptions, processes: int) -> dict:
+	"""
+	Converts all *files* and returns the measured results.
+	With *processes* set to 0, all files are converted sequentially in this process.
+	"""
+	tasks = [(f, Path(output_root, f.relative_to(source_root).with_suffix(".json")), options) for f in files]
+
+	start = time.perf_counter()
+	if processes:
+		with mp.Pool(processes=processes) as pool:
+			results = pool.starmap(timed_convert, tasks, chunksize=4)
+	else:
+		results = [timed_convert(*task) for task in tasks]
+	total = time.perf_counter() - start
+
+	# failed conversions are not part of the timings, since they usually fail before doing any work
+	successful = [result for result in results if result[2] != "failed"]
+	durations = sorted(duration for duration, _, _ in successful)
+	stages = {}
+	for _, file_stages, _ in successful:
+		for stage, duration in file_stages.items():
+			stages[stage] = stages.get(stage, 0.0) + duration
+
+	return {
+		"files": len(files),
+		"empty_files": sum(1 for result in results if result[2] == "empty"),
+		"failed_files": len(results) - len(successful),
+		"source_bytes": sum(f.stat().st_size for f in files),
+		"total_seconds": total,
+		"files_per_second": len(successful) / total if total else 0.0,
+		"p50_seconds": statistics.median(durations) if durations else 0.0,
+		"p99_seconds": durations[min(len(durations)-1, int(len(durations)*0.99))] if durations else 0.0,
+		"stage_seconds": stages,
+	}
+
+def print_results(results: dict) -> None:
+	print(f"files:       {results['files']} ({results['source_bytes']/1024/1024:.1f} MiB), "
+		f"{results['empty_files']} empty, {results['failed_files']} failed")
+	print(f"total:       {results['total_seconds']:.2f}s")
+	print(f"throughput:  {results['files_per_second']:.1f} files/s")
+	print(f"per file:    p50 {results['p50_seconds']*1000:.2f}ms, p99 {results['p99_seconds']*1000:.2f}ms")
+	stage_total = sum(results["stage_seconds"].values())
+	for stage, duration in sorted(results["stage_seconds"].items(), key=lambda item: -item[1]):
+		print(f"  {stage:<10} {duration:8.2f}s  {duration/stage_total*100 if stage_total else 0:5.1f}%")
+
+def git_commit() -> str | None:
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def main():
+	parser = ArgumentParser(description="Benchmarks the lua to json conversion.")
+	parser.add_argument("-n", "--files", type=int, default=300, help="amount of synthetic files to generate")
+	parser.add_argument("-e", "--entries", type=int, default=50, help="average amount of entries per synthetic file")
+	parser.add_argument("-s", "--src", type=Path, help="convert the lua files of a real client source directory (e.g. Src/en-US) instead, "
+		"only using the directories the converter converts")
+	ConvertOptions.add_arguments(parser)
+	parser.add_argument("-p", "--processes", type=int, default=0,
+		help="amount of pool processes, 0 converts sequentially which gives the most accurate stage times")
+	parser.add_argument("--profile", action="store_true", help="run sequentially with cProfile and print the hotspots")
+	parser.add_argument("-o", "--output", type=Path, default=Path("benchmark_results.json"),
+		help="json file the results are appended to")
+	args = parser.parse_args()
+	options = ConvertOptions.from_args(args)
+
+	with tempfile.TemporaryDirectory() as tempdir:
+		if args.src:
+			source_root = args.src
+			files = source_files(args.src)
+		else:
+			source_root = Path(tempdir, "Src")
+			print(f"Generating {args.files} synthetic lua files...")
+			files = generate_corpus(source_root, args.files, args.entries)
+		output_root = Path(tempdir, "SrcJson")
+
+		if args.profile:
+			profiler = cProfile.Profile()
+			results = profiler.runcall(run_benchmark, files, source_root, output_root, options, 0)
+			pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+		else:
+			results = run_benchmark(files, source_root, output_root, options, args.processes)
+
+	print_results(results)
+	if results["failed_files"]:
+		print("Some files failed to convert, the results are not comparable and have not been saved.")
+		return
+
+	# append results, so runs from different commits can be compared
+	results |= {
+		"timestamp": datetime.now(timezone.utc).isoformat(),
+		"commit": git_commit(),
+		"corpus": str(args.src) if args.src else f"synthetic:{args.files}x{args.entries}",
+		"backend": options.backend,
+		"json_profile": options.profile,
+		"processes": args.processes,
+		"python": platform.python_version(),
+	}
+	history = []
+	if args.output.exists():
+		with open(args.output, "r", encoding="utf8") as f:
+			history = json.load(f)
+	history.append(results)
+	with open(args.output, "w", encoding="utf8") as f:
+		json.dump(history, f, indent=2)
+	print(f"Results written to {args.output}.")
+
+if __name__ == "__main__":
+	main()
@@ -1,8 +1,11 @@
 import shutil
 from pathlib import Path
 import multiprocessing as mp
+from functools import partial
+from argparse import ArgumentParser
 
-from lua_convert import Client, convert_lua
+from lua_convert import Client, ConvertOptions, JsonWriter, convert_lua_source
+from convert_manifest import ConvertManifest
 
 
 directory_destinations = [
@@ -20,36 +23,157 @@ def clear_json_files(client: Client):
 	client_json_dir = Path("SrcJson", client.name)
 	shutil.rmtree(client_json_dir, ignore_errors=True)
 
-def convert_all_files(client: Client):
-	with mp.Pool(processes=mp.cpu_count()) as pool:
-		for DIR_FROM, DIR_TO in directory_destinations:
-			# jp has different folder for story files
-			if DIR_FROM.name == "story" and client.name == "JP":
-				DIR_FROM = DIR_FROM.with_name(DIR_FROM.name+"jp")
+def client_tasks(client: Client, manifest: ConvertManifest | None = None) -> list[tuple[Path, Path]]:
+	"""
+	Returns the lua file and json destination of all files of *client* that have to be converted.
+	If a *manifest* is given, files that did not change since the last conversion are left out.
+	"""
+	tasks = []
+	for DIR_FROM, DIR_TO in directory_destinations:
+		# jp has different folder for story files
+		if DIR_FROM.name == "story" and client.name == "JP":
+			DIR_FROM = DIR_FROM.with_name(DIR_FROM.name+"jp")
 
-			# set path constants
-			CONVERT_FROM = Path("Src", client.locale_code, DIR_FROM)
-			CONVERT_TO = Path("SrcJson", client.name, DIR_TO)
+		# set path constants
+		CONVERT_FROM = Path("Src", client.locale_code, DIR_FROM)
+		CONVERT_TO = Path("SrcJson", client.name, DIR_TO)
 
-			# find all files inside the folder
-			for file in CONVERT_FROM.rglob("*.lua"):
-				target = Path(CONVERT_TO, file.relative_to(CONVERT_FROM).with_suffix(".json"))
-				pool.apply_async(convert_lua, (file, target,))
-		pool.close()
-		pool.join()
+		# find all files inside the folder
+		for file in CONVERT_FROM.rglob("*.lua"):
+			target = Path(CONVERT_TO, file.relative_to(CONVERT_FROM).with_suffix(".json"))
+			if manifest and manifest.is_unchanged(file, target):
+				continue
+			tasks.append((file, target))
+	return tasks
 
-def reconvert_all_files(client: Client):
-	clear_json_files(client)
-	convert_all_files(client)
+def schedule_chunks(tasks: list[tuple[Path, Path]], processes: int, chunks_per_process: int = 16) -> list[list[tuple[Path, Path]]]:
+	"""
+	Groups *tasks* into chunks of similar total source size, ordered from the largest files to the smallest.
+	Files larger than a chunk are converted on their own, so the biggest files start first
+	and the many small files fill up the pool processes at the end.
+	"""
+	sizes = {file: file.stat().st_size for file, _ in tasks}
+	tasks = sorted(tasks, key=lambda task: sizes[task[0]], reverse=True)
+	chunk_size = sum(sizes.values()) / max(1, processes*chunks_per_process)
+
+	chunks = []
+	chunk, current_size = [], 0
+	for task in tasks:
+		if chunk and current_size + sizes[task[0]] > chunk_size:
+			chunks.append(chunk)
+			chunk, current_size = [], 0
+		chunk.append(task)
+		current_size += sizes[task[0]]
+	if chunk:
+		chunks.append(chunk)
+	return chunks
+
+def convert_chunk(chunk: list[tuple[Path, Path]], options: ConvertOptions) -> list[tuple[Path, Path, bool, bytes | None]]:
+	"""
+	Converts all files of *chunk* and returns whether the conversion of each file was successful with its encoded json.
+	Writing the json is left to the writer stage in the main process.
+	"""
+	results = []
+	for file, target in chunk:
+		try:
+			with open(file, "rb") as f:
+				source = f.read()
+			results.append((file, target, True, convert_lua_source(source, file, options)))
+		except Exception as error:
+			print(f"Failed to convert {file}: {error}")
+			results.append((file, target, False, None))
+	return results
+
+def convert_clients(clients: list[Client], manifests: dict[Client, ConvertManifest] | None = None,
+		options: ConvertOptions = ConvertOptions(), processes: int | None = None):
+	"""
+	Converts all lua files of *clients* in one shared pool. If *manifests* are given, only files that changed since the
+	last conversion are converted and json files of removed lua files are deleted.
+	"""
+	processes = processes or mp.cpu_count()
+	manifests = manifests or {}
+	file_clients = {}
+	tasks = []
+	for client in clients:
+		for file, target in client_tasks(client, manifests.get(client)):
+			file_clients[file] = client
+			tasks.append((file, target))
+
+	converted = failed = 0
+	with mp.Pool(processes=processes) as pool, JsonWriter() as writer:
+		for results in pool.imap_unordered(partial(convert_chunk, options=options), schedule_chunks(tasks, processes)):
+			for file, target, successful, data in results:
+				# only successful conversions are recorded, failed ones will be retried on the next run
+				if not successful:
+					failed += 1
+					continue
+				converted += 1
+				output_hash = writer.write(target, data) if data is not None else None
+				if manifest := manifests.get(file_clients[file]):
+					manifest.record(file, output_hash)
+
+	for client, manifest in manifests.items():
+		removed = manifest.remove_stale()
+		manifest.save()
+		print(f"{client.name}: removed {removed} deleted files.")
+	print(f"Converted {converted} changed files of {', '.join(client.name for client in clients)}, {failed} failed.")
+
+def convert_all_files(client: Client, manifest: ConvertManifest | None = None, options: ConvertOptions = ConvertOptions()):
+	"""
+	Converts all lua files of *client*. If a *manifest* is given, only files that changed since the
+	last conversion are converted and json files of removed lua files are deleted.
+	"""
+	convert_clients([client], {client: manifest} if manifest else None, options)
+
+def update_clients(clients: list[Client], options: ConvertOptions = ConvertOptions(), processes: int | None = None):
+	manifests = {client: ConvertManifest.for_client(client, options) for client in clients}
+	convert_clients(clients, manifests, options, processes)
+
+def reconvert_clients(clients: list[Client], options: ConvertOptions = ConvertOptions(), processes: int | None = None):
+	manifests = {}
+	for client in clients:
+		clear_json_files(client)
+		manifests[client] = ConvertManifest.for_client(client, options)
+		manifests[client].delete()
+	convert_clients(clients, manifests, options, processes)
+
+def update_all_files(client: Client, options: ConvertOptions = ConvertOptions()):
+	update_clients([client], options)
+
+def reconvert_all_files(client: Client, options: ConvertOptions = ConvertOptions()):
+	reconvert_clients([client], options)
 
 
 def main():
+	parser = ArgumentParser()
+	parser.add_argument("-c", "--clients", nargs="+", choices=Client.__members__,
+		help="clients to convert without asking, all files of all given clients are converted in one pool")
+	parser.add_argument("-a", "--all", action="store_true", help="convert all clients without asking")
+	parser.add_argument("-r", "--reconvert", action="store_true",
+		help="reconvert all files instead of only changed files, only used together with -c or -a")
+	parser.add_argument("-p", "--processes", type=int, help="amount of pool processes, defaults to the amount of cpus")
+	ConvertOptions.add_arguments(parser)
+	args = parser.parse_args()
+	options = ConvertOptions.from_args(args)
+
+	if args.all or args.clients:
+		clients = list(Client) if args.all else [Client[name] for name in args.clients]
+		if args.reconvert:
+			reconvert_clients(clients, options, args.processes)
+		else:
+			update_clients(clients, options, args.processes)
+		return
+
 	client_input = input("Type the game version to convert: ")
 	if not client_input in Client.__members__:
 		print(f"Unknown client {client_input}, aborting.")
 		return
 	client = Client[client_input]
-	reconvert_all_files(client)
+
+	if input("Reconvert all files instead of only changed files? (y/n): ").lower() == "y":
+		reconvert_all_files(client, options)
+	else:
+		update_all_files(client, options)
 
 if __name__ == "__main__":
 	main()
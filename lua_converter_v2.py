@@ -1,10 +1,11 @@
 import re
 from pathlib import Path
+from collections import deque
 import multiprocessing as mp
 from argparse import ArgumentParser
 from git import Repo
 
-from lua_convert import Client, convert_lua
+from lua_convert import Client, ConvertOptions, JsonWriter, convert_lua_source
 
 
 ALLOWED_GAMECFG_FOLDERS = {"buff", "dungeon", "skill", "story", "storyjp", "backyardtheme", "guide"}
@@ -47,16 +48,24 @@ class SrcRepo(Repo):
 	def changes_from_commit(self, commit):
 		"""
 		:return: the tuple (client, version, files)
-		where client is a string, version is a string and files a list
+		where client is a string, version is a string and files a dict of the changed paths to their blob sha
 
 		or None, if the commit is not a valid commit
 		"""
 		re_result = REGEX.findall(commit.message)
 		if re_result:
 			diff_index = commit.parents[0].diff(commit)
-			files = [diff.b_path for diff in diff_index if diff.change_type in ["A", "M"]]
+			files = {diff.b_path: diff.b_blob.hexsha for diff in diff_index if diff.change_type in ["A", "M"]}
 			return *re_result[0], files
 
+	def commit_files(self, paths: list[Path], message: str, chunk_size: int = 500):
+		"""
+		Stages only the files at *paths* (relative to the repository) and commits them.
+		"""
+		for i in range(0, len(paths), chunk_size):
+			self.git.add("--", *paths[i:i+chunk_size])
+		self.git.commit("-m", message, "--allow-empty")
+
 
 def is_allowed_gamecfg(path: Path):
 	return bool(ALLOWED_GAMECFG_FOLDERS.intersection(path.parts))
@@ -67,49 +76,106 @@ def normalize_gamecfg_paths(path: Path):
 	return path
 
 
-def convert_new_files(override_commit: str = None):
+def conversion_paths(client: Client, files: dict[str, str]):
+	"""
+	Yields the lua source path, blob sha and json destination of all files of a commit that have to be converted.
+	"""
+	for filepath, blob_sha in files.items():
+		filepath = Path(filepath)
+		index = 1
+		if "gamecfg" in filepath.parts:
+			if not is_allowed_gamecfg(filepath):
+				continue
+			index += 1
+		elif "sharecfg" not in filepath.parts:
+			continue
+		# else is sharecfg file
+		path2 = filepath.relative_to(*filepath.parts[:index])
+
+		lua_require = Path(LUA_REPO_NAME, filepath)
+		json_destination = normalize_gamecfg_paths( Path(JSON_REPO_NAME, client.name, path2.with_suffix(".json")) )
+		yield lua_require, blob_sha, json_destination
+
+
+# every pool worker reads blobs through the persistent "git cat-file --batch" process of its own repo instance
+_blob_repo: Repo | None = None
+
+def convert_blob(blob_sha: str, filepath: Path, options: ConvertOptions) -> bytes | None:
+	"""
+	Converts the blob *blob_sha* of the lua repository as if it was the file at *filepath*, see convert_lua_source.
+	"""
+	global _blob_repo
+	if _blob_repo is None:
+		_blob_repo = Repo(LUA_REPO_NAME)
+	_, _, _, source = _blob_repo.git.get_object_data(blob_sha)
+	return convert_lua_source(source, filepath, options)
+
+def convert_new_files(override_commit: str = None, options: ConvertOptions = ConvertOptions(), commits_ahead: int = 2):
+	"""
+	Converts the changed files of all new commits of the lua repository and commits them to the json repository.
+	The files of up to *commits_ahead* following commits are converted while the json of a commit is written and committed.
+	"""
 	repo = SrcRepo(LUA_REPO_NAME)
 	repo_json = SrcRepo(JSON_REPO_NAME)
 
-	for client, version, files in repo.pull_and_get_changes(override_commit):
-		client = Client.from_locale(client)
-
-		with mp.Pool(processes=mp.cpu_count()) as pool:
-			for filepath in files:
-				filepath = Path(filepath)
-				index = 1
-				if "gamecfg" in filepath.parts:
-					if not is_allowed_gamecfg(filepath):
-						continue
-					index += 1
-				elif "sharecfg" not in filepath.parts:
-					continue
-				# else is sharecfg file
-				path2 = filepath.relative_to(*filepath.parts[:index])
-
-				lua_require = Path(LUA_REPO_NAME, filepath)
-				json_destination = normalize_gamecfg_paths( Path(JSON_REPO_NAME, client.name, path2.with_suffix(".json")) )
-				pool.apply_async(convert_lua, (lua_require, json_destination,))
-
-			# explicitly join the pool
-			# since the pool only receives async tasks, this waits for their completion
-			pool.close()
-			pool.join()
-
-		repo_json.git.add(client.name) # adds only all files inside the current clients directory
-		repo_json.git.commit("-m", f"{client.name} {version}", "--allow-empty")
+	with mp.Pool(processes=mp.cpu_count()) as pool, JsonWriter() as writer:
+		# sources are read from the blobs of every commit instead of the working tree,
+		# so the pool can already convert the files of the following commits
+		queued = deque()
+		# conversions are shared by all queued commits using the same blob and released after their last use
+		conversions: dict[tuple, list] = {}
+
+		def commit_oldest():
+			# json files are written in commit order, since later commits can change the same files
+			client, version, results = queued.popleft()
+			written = []
+			for json_destination, (lua_require, key) in results.items():
+				conversion = conversions[key]
+				try:
+					data = conversion[0].get()
+				except Exception as error:
+					print(f"Failed to convert {lua_require} for {client.name} {version}: {error}")
+					data = None
+				else:
+					if data is not None:
+						writer.write(json_destination, data)
+						written.append(json_destination.relative_to(JSON_REPO_NAME))
+				conversion[1] -= 1
+				if not conversion[1]:
+					del conversions[key]
+			writer.flush()
+			repo_json.commit_files(written, f"{client.name} {version}")
+
+		for client, version, files in repo.pull_and_get_changes(override_commit):
+			client = Client.from_locale(client)
+			results = {}
+			for lua_require, blob_sha, json_destination in conversion_paths(client, files):
+				# identical blobs (e.g. the same file in multiple clients) only have to be converted once
+				key = (blob_sha, "sharecfg" in lua_require.parts, lua_require.stem)
+				if key not in conversions:
+					conversions[key] = [pool.apply_async(convert_blob, (blob_sha, lua_require, options,)), 0]
+				conversions[key][1] += 1
+				results[json_destination] = (lua_require, key)
+			queued.append((client, version, results))
+			if len(queued) > commits_ahead:
+				commit_oldest()
+
+		while queued:
+			commit_oldest()
 	repo_json.remotes.origin.push()
 
 
 def main():
 	parser = ArgumentParser()
 	parser.add_argument("-c", "--commit-sha", type=str, help="commit sha from which to start converting")
+	ConvertOptions.add_arguments(parser)
 	args = parser.parse_args()
+	options = ConvertOptions.from_args(args)
 
 	if sha := args.commit_sha:
-		convert_new_files(sha)
+		convert_new_files(sha, options)
 	else:
-		convert_new_files()
+		convert_new_files(options=options)
 
 if __name__ == "__main__":
 	main()
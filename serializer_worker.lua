@@ -0,0 +1,78 @@
+package.path = package.path .. ";?.lua"
+local cjson = require("cjson")
+cjson.encode_sparse_array(true)
+
+function Vector3(a, b, c)
+    return {a, b, c}
+end
+
+-- every file runs in its own environment, so globals set by one file are not visible to the next one
+local function new_env()
+    local uv0 = {}
+    local env = {uv0 = uv0, pg = uv0, Vector3 = Vector3}
+    return setmetatable(env, {__index = _G})
+end
+
+-- same as serializer.lua, but the pg table is reset for every file
+local function load_sharecfg(chunk, name)
+    local env = new_env()
+    setfenv(chunk, env)
+    chunk()
+    return env.pg[name]
+end
+
+-- same as serializer2.lua
+local function load_gamecfg(chunk)
+    setfenv(chunk, new_env())
+    return chunk()
+end
+
+-- modules required by a file are unloaded again after the request
+local function snapshot_loaded()
+    local loaded = {}
+    for key, value in pairs(package.loaded) do
+        loaded[key] = value
+    end
+    return loaded
+end
+
+local function restore_loaded(loaded)
+    for key in pairs(package.loaded) do
+        if loaded[key] == nil then
+            package.loaded[key] = nil
+        end
+    end
+    for key, value in pairs(loaded) do
+        package.loaded[key] = value
+    end
+end
+
+-- requests are a single line of the form "<mode>\t<chunkname>\t<name>\t<length>"
+-- followed by exactly <length> bytes of lua source code
+-- every response is a header line "<status> <length>" followed by exactly <length> bytes of payload
+while true do
+    local line = io.read("*l")
+    if not line then break end
+
+    local mode, chunkname, name, length = line:match("^(%a+)\t([^\t]*)\t([^\t]*)\t(%d+)")
+    local source = length and io.read(tonumber(length)) or ""
+    local loaded = snapshot_loaded()
+    local ok, result = pcall(function()
+        local chunk = assert(loadstring(source, "@" .. chunkname))
+        if mode == "sharecfg" then
+            return cjson.encode(load_sharecfg(chunk, name))
+        elseif mode == "gamecfg" then
+            return cjson.encode(load_gamecfg(chunk))
+        end
+        error("unknown request: " .. line)
+    end)
+    restore_loaded(loaded)
+
+    local status = "ok"
+    if not ok then
+        status = "err"
+        result = tostring(result):gsub("[\r\n]", " ")
+    end
+    io.write(status, " ", #result, "\n", result)
+    io.flush()
+end